@@ -9,7 +9,7 @@ import streamlit as st
 import json
 import pandas as pd
 
-from config import MODEL, SEARCH_K, MAX_TOKENS, STATIC_GREETINGS_AND_GENERAL, MAX_INPUT_TOKENS_PER_MINUTE, TOKEN_BUFFER, TOPICS
+from config import MODEL, SEARCH_K, RERANK_CANDIDATES, MAX_TOKENS, STATIC_GREETINGS_AND_GENERAL, MAX_INPUT_TOKENS_PER_MINUTE, TOKEN_BUFFER, TOPICS
 from agent.tools import get_quote
 
 from vectorstore.vector_store import VectorStore
@@ -29,7 +29,8 @@ class ChatBot:
     self.topics = TOPICS
     self.max_tokens = MAX_TOKENS
     self.index = index
-    self.vector_store = VectorStore(index_name=index)
+    # Read side: fail loudly rather than answer from an empty index
+    self.vector_store = VectorStore(index_name=index, create_index=False)
     # self.vector_db.load_db() # For local dev
     self.session_manager = SessionManager(
       anthropic_client=self.anthropic,
@@ -82,6 +83,9 @@ class ChatBot:
     images = []
     links = []
     references = []
+    # Chunks carry only their own media; hits from the same document can
+    # still share an element, so each media id is listed once
+    seen_media = set()
     # Process media items if they exist
     for search_result in search_results:
       _, _, metadata = search_result
@@ -89,6 +93,7 @@ class ChatBot:
       media_urls = metadata.get('media_urls', [])
       media_types = metadata.get('media_types', [])
       media_texts = metadata.get('media_texts', [])
+      media_ids = metadata.get('media_ids', [])
 
       # Ensure all media lists have the same length by padding with None if necessary
       max_media_length = max(
@@ -98,8 +103,14 @@ class ChatBot:
           (max_media_length - len(media_types))
       media_texts = media_texts + [None] * \
           (max_media_length - len(media_texts))
-
-      for i, (url, media_type, text) in enumerate(zip(media_urls, media_types, media_texts)):
+      media_ids = media_ids + [None] * (max_media_length - len(media_ids))
+
+      for i, (url, media_type, text, media_id) in enumerate(
+          zip(media_urls, media_types, media_texts, media_ids)):
+        if media_id:
+          if media_id in seen_media:
+            continue
+          seen_media.add(media_id)
         if url and media_type == 'image':
           images.append({
             'type': 'image',
@@ -143,7 +154,10 @@ class ChatBot:
 
     clean_filter = {k: v for k, v in filter.items() if v is not None}
 
-    search_results = await self.vector_store.search_similar(search_input, SEARCH_K, filter=clean_filter)
+    # Pre-rank SEARCH_K candidates down to RERANK_CANDIDATES for the rerank;
+    # the context is those RERANK_CANDIDATES reranked chunks
+    search_results = await self.vector_store.search_similar(
+      search_input, SEARCH_K, filter=clean_filter, rerank_k=RERANK_CANDIDATES)
     if search_results:
       images, links, references = self.get_media(search_results)
 
@@ -7,7 +7,7 @@ import threading
 import time
 import streamlit as st
 from agent.chatbot import ChatBot
-from config import MODEL, IDENTITY, PERSONALITY, PRIORITY_THRESHOLD, PERSONALITY_LEVEL, ON_TOPIC_IDENTITY, OFF_TOPIC_IDENTITY, INDEX, TOPICS, STATIC_GREETINGS_AND_GENERAL, SEARCH_K
+from config import MODEL, IDENTITY, PERSONALITY, PRIORITY_THRESHOLD, PERSONALITY_LEVEL, ON_TOPIC_IDENTITY, OFF_TOPIC_IDENTITY, INDEX, TOPICS, STATIC_GREETINGS_AND_GENERAL, SEARCH_K, RERANK_CANDIDATES
 
 logging.basicConfig(level=logging.INFO)
 
@@ -257,6 +257,7 @@ def context_manager(contexts):
     st.write(f"Model: {MODEL}")
     st.write(f"Index: {INDEX}")
     st.write(f"Search K: {SEARCH_K}")
+    st.write(f"Rerank candidates: {RERANK_CANDIDATES}")
 
   for key in keys_to_remove:
     delete_context(key)
@@ -1,8 +1,46 @@
+import os
+
 MODEL = """claude-3-5-sonnet-20241022"""  # claude-3-haiku-20240307
 
 INDEX = """gin-lane-docs-v5"""
 
+# "pinecone" or "local" (in-process NumPy index persisted under LOCAL_INDEX_DIR)
+VECTOR_BACKEND = "pinecone"
+# Every data path is resolved from this file, not the working directory:
+# run.py runs from src/ while the chat app is started from the repo root
+DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+LOCAL_INDEX_DIR = os.path.join(DATA_DIR, "db")
+# Content-addressed store of document embeddings reused across embed runs
+EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, "db", "embedding_cache.sqlite")
+# Voyage embedding throughput limits used by the async embedder
+EMBED_CONCURRENCY = 4
+EMBED_TOKENS_PER_MINUTE = 1000000
+EMBED_REQUESTS_PER_MINUTE = 300
+EMBED_MAX_BATCH_TOKENS = 100000
+# Opt-in store of chunk text and media beside the index, keyed by chunk id, e.g.
+# os.path.join(DATA_DIR, "db", "chunk_store.sqlite"). Text and media then leave the
+# index metadata, so the store has to be deployed with the chat app. None = all in the index
+CHUNK_STORE_PATH = None
+# Concurrent index upserts in flight during ingestion
+UPSERT_CONCURRENCY = 4
+# Per-index record of chunk content / metadata hashes for incremental re-indexing
+MANIFEST_DIR = os.path.join(DATA_DIR, "db", "manifests")
+# Processes used to chunk files in parallel (0 = one per CPU, 1 = sequential)
+CHUNK_WORKERS = 0
+# Persisted size / mtime / content hash of scanned source files, one file per chunker
+FINGERPRINT_DIR = os.path.join(DATA_DIR, "db", "fingerprints")
+# Processed documents keyed by file content hash, processor, chunk settings and config entry
+CHUNK_CACHE_PATH = os.path.join(DATA_DIR, "db", "chunk_cache.sqlite")
+# Processes per PDF for page-range parallelism (1 = stream pages in order)
+PDF_PAGE_WORKERS = 1
+# Input fingerprints of the run.py all stages, used to skip unchanged stages
+STAGE_CACHE_PATH = os.path.join(DATA_DIR, "db", "stages.json")
+
 SEARCH_K = 50
+# Candidates the local pre-ranker keeps out of SEARCH_K for the Voyage rerank.
+# The chat context is these after reranking, so it is RERANK_CANDIDATES chunks
+# rather than SEARCH_K; None sends all SEARCH_K and keeps all of them
+RERANK_CANDIDATES = 20
 DEF_CHUNK_SIZE = 500
 DEF_CHUNK_OVERLAP = 50
 MAX_TOKENS = 1024  # 2048
@@ -11,6 +49,7 @@ MAX_INPUT_TOKENS_PER_MINUTE = 40000
 PERSONALITY_LEVEL = 2
 PRIORITY_THRESHOLD = 0.3
 
+# A .jsonl or .jsonl.gz name switches the chunk datasets to the streamed JSON Lines format
 DOCS_FILE_NAME = """gin_lane_docs_v3.json"""
 PROJECTS_FILE_NAME = """gin_lane_projects_v2.json"""
 
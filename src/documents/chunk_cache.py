@@ -0,0 +1,73 @@
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Sequence, Set
+
+
+# Bump when a processor change alters the chunks it produces for the same input
+CACHE_VERSION = 5
+
+
+class ChunkCache:
+  """
+    Persistent store of processed documents (a file's chunks plus document
+    metadata) keyed by everything that determines them: the file's content
+    hash, the processor, chunk size / overlap and the file's config entries.
+    Files whose key is unchanged are served from here and never re-parsed.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with self._connect() as conn:
+      conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+          key TEXT PRIMARY KEY,
+          document BLOB NOT NULL
+        )""")
+
+  @contextmanager
+  def _connect(self) -> Iterator[sqlite3.Connection]:
+    conn = sqlite3.connect(self.path, timeout=30)
+    try:
+      conn.execute("PRAGMA journal_mode=WAL")
+      with conn:
+        yield conn
+    finally:
+      conn.close()
+
+  @staticmethod
+  def key(**parts: Any) -> str:
+    encoded = json.dumps(
+      {"version": CACHE_VERSION, **parts}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+  def existing(self, keys: Sequence[str]) -> Set[str]:
+    """The subset of keys that are cached, without reading their documents"""
+    found = set()
+    unique = list(dict.fromkeys(keys))
+    batch_size = 500  # stay under sqlite's bound-parameter limit
+    with self._connect() as conn:
+      for i in range(0, len(unique), batch_size):
+        batch = unique[i: i + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        found.update(key for (key,) in conn.execute(
+          f"SELECT key FROM documents WHERE key IN ({placeholders})", batch))
+    return found
+
+  def get(self, key: str) -> Optional[Dict[str, Any]]:
+    with self._connect() as conn:
+      row = conn.execute(
+        "SELECT document FROM documents WHERE key = ?", (key,)).fetchone()
+    if row is None:
+      return None
+    return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+  def put(self, key: str, document: Dict[str, Any]):
+    blob = zlib.compress(json.dumps(document, ensure_ascii=False).encode('utf-8'))
+    with self._connect() as conn:
+      conn.execute(
+        "INSERT OR REPLACE INTO documents (key, document) VALUES (?, ?)", (key, blob))
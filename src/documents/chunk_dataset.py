@@ -0,0 +1,128 @@
+"""
+  Chunk datasets as JSON Lines, one record per line:
+
+    {"record": "header", "metadata": {...}}       first line, the dataset metadata block
+    {"record": "document", "document": {...}}     a document without its chunks
+    {"record": "chunk", "chunk": {...}}           one of that document's chunks
+
+  Files ending in .gz are gzip-compressed. Paths ending in .json keep the
+  original single JSON document format.
+"""
+
+import os
+import gzip
+import json
+import shutil
+from typing import Dict, Any, Iterator, List, Optional, IO
+
+from documents.document_utils import DocumentUtils
+
+
+def is_jsonl(path: str) -> bool:
+  return path.endswith(".jsonl") or path.endswith(".jsonl.gz")
+
+
+def open_text(path: str, mode: str, compressed: Optional[bool] = None) -> IO[str]:
+  if compressed is None:
+    compressed = path.endswith(".gz")
+  if compressed:
+    return gzip.open(path, mode + "t", encoding="utf-8")
+  return open(path, mode, encoding="utf-8")
+
+
+def dumps(record: Dict[str, Any]) -> str:
+  return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class ChunkDatasetWriter:
+  """
+    Streams documents to a JSONL chunk dataset as they are produced. The
+    metadata header is usually only known once every document has been
+    seen, so records go to a temporary body file and the header is
+    written in front of it on close.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self.metadata: Dict[str, Any] = {}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    self._body_path = f"{path}.body-{os.getpid()}"
+    self._body = open(self._body_path, "w", encoding="utf-8")
+
+  def write_document(self, document: Dict[str, Any]):
+    self._body.write(dumps({
+      "record": "document",
+      "document": {key: value for key, value in document.items() if key != "chunks"}
+    }))
+    for chunk in document.get("chunks", []):
+      self._body.write(dumps({"record": "chunk", "chunk": chunk}))
+
+  def write_metadata(self, metadata: Dict[str, Any]):
+    self.metadata = metadata
+
+  def close(self):
+    self._body.close()
+    tmp_path = f"{self.path}.tmp-{os.getpid()}"
+    try:
+      with open_text(tmp_path, "w", compressed=self.path.endswith(".gz")) as out, open(self._body_path, "r", encoding="utf-8") as body:
+        out.write(dumps({"record": "header", "metadata": self.metadata}))
+        shutil.copyfileobj(body, out)
+      os.replace(tmp_path, self.path)
+    finally:
+      for path in (tmp_path, self._body_path):
+        if os.path.exists(path):
+          os.remove(path)
+
+  def discard(self):
+    self._body.close()
+    os.remove(self._body_path)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    if exc_type is None:
+      self.close()
+    else:
+      self.discard()
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+  with open_text(path, "r") as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+
+def iter_chunks(path: str) -> Iterator[Dict[str, Any]]:
+  """Chunks of a dataset in file order, one line at a time for JSONL"""
+  if not is_jsonl(path):
+    for document in DocumentUtils.load_from_json(path)["documents"]:
+      yield from document["chunks"]
+    return
+
+  for record in iter_records(path):
+    if record["record"] == "chunk":
+      yield record["chunk"]
+
+
+class ChunkStream:
+  """
+    Re-iterable view over the chunks of several datasets. JSONL datasets are
+    streamed a line at a time on every pass; a .json dataset has to be
+    parsed whole anyway, so it is loaded on the first pass and its chunks
+    are reused after that.
+  """
+
+  def __init__(self, paths: List[str]):
+    self.paths = paths
+    self._loaded: Dict[str, List[Dict[str, Any]]] = {}
+
+  def __iter__(self) -> Iterator[Dict[str, Any]]:
+    for path in self.paths:
+      if is_jsonl(path):
+        yield from iter_chunks(path)
+        continue
+      if path not in self._loaded:
+        self._loaded[path] = list(iter_chunks(path))
+      yield from self._loaded[path]
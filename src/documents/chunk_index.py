@@ -0,0 +1,126 @@
+import re
+from collections import deque
+from typing import List, Dict, Set, Iterable, Optional
+
+import numpy as np
+
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+
+def tokenize(text: str) -> Set[str]:
+  return set(WORD_PATTERN.findall(text))
+
+
+class PhraseMatcher:
+  """
+    Aho-Corasick automaton over a fixed set of phrases. One scan of a text
+    reports every phrase occurring in it as a substring, however many
+    phrases there are.
+  """
+
+  def __init__(self, phrases: Iterable[str]):
+    self.goto: List[Dict[str, int]] = [{}]
+    self.fail: List[int] = [0]
+    self.output: List[Set[str]] = [set()]
+
+    for phrase in phrases:
+      if phrase:
+        self._add(phrase)
+    self._link()
+
+  def _add(self, phrase: str):
+    state = 0
+    for char in phrase:
+      next_state = self.goto[state].get(char)
+      if next_state is None:
+        next_state = len(self.goto)
+        self.goto[state][char] = next_state
+        self.goto.append({})
+        self.fail.append(0)
+        self.output.append(set())
+      state = next_state
+    self.output[state].add(phrase)
+
+  def _link(self):
+    queue = deque(self.goto[0].values())
+    while queue:
+      state = queue.popleft()
+      for char, next_state in self.goto[state].items():
+        queue.append(next_state)
+        fallback = self.fail[state]
+        while fallback and char not in self.goto[fallback]:
+          fallback = self.fail[fallback]
+        self.fail[next_state] = self.goto[fallback].get(char, 0)
+        self.output[next_state] |= self.output[self.fail[next_state]]
+
+  def find(self, text: str) -> Set[str]:
+    found = set()
+    state = 0
+    for char in text:
+      while state and char not in self.goto[state]:
+        state = self.fail[state]
+      state = self.goto[state].get(char, 0)
+      if self.output[state]:
+        found |= self.output[state]
+    return found
+
+
+class ChunkTokenIndex:
+  """
+    Token counts and ids for a stream of chunks plus an inverted index
+    token -> chunk positions, built in one pass. A query only touches the
+    postings of its own tokens, so scoring scales with the number of hits,
+    not the corpus.
+  """
+
+  def __init__(self, chunks: Iterable[Dict]):
+    postings: Dict[str, List[int]] = {}
+    token_counts = []
+    self.chunk_ids: List[str] = []
+
+    client_positions: Dict[str, List[int]] = {}
+    for position, chunk in enumerate(chunks):
+      self.chunk_ids.append(chunk['chunk_id'])
+      tokens = tokenize(chunk.get('content', '').lower())
+      token_counts.append(len(tokens))
+      for token in tokens:
+        postings.setdefault(token, []).append(position)
+
+      client = chunk.get('client_name', '').lower()
+      if client:
+        client_positions.setdefault(client, []).append(position)
+
+    self.size = len(self.chunk_ids)
+    self.token_counts = np.array(token_counts, dtype=np.int64)
+    self.postings = {
+      token: np.array(positions, dtype=np.int64)
+      for token, positions in postings.items()
+    }
+    self.client_positions = client_positions
+    self.client_matcher = PhraseMatcher(client_positions)
+
+  def overlap_counts(self, tokens: Iterable[str]) -> np.ndarray:
+    """Number of the given tokens each chunk contains"""
+    hits = [self.postings[token] for token in tokens if token in self.postings]
+    if not hits:
+      return np.zeros(self.size, dtype=np.int64)
+    return np.bincount(np.concatenate(hits), minlength=self.size)
+
+  def match(self, text: str, overlap: Optional[float] = None) -> np.ndarray:
+    """
+      Sorted positions of chunks whose client name occurs in text, or, when
+      overlap is given, whose content tokens overlap the text's tokens by
+      more than overlap.
+    """
+    selected = set()
+    if overlap is not None:
+      counts = self.overlap_counts(tokenize(text))
+      candidates = np.flatnonzero(counts)
+      ratios = counts[candidates] / self.token_counts[candidates]
+      selected.update(candidates[ratios > overlap].tolist())
+
+    for client in self.client_matcher.find(text):
+      selected.update(self.client_positions[client])
+
+    return np.array(sorted(selected), dtype=np.int64)
@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+from vectorstore import storage
+
+
+@dataclass
+class FileEntry:
+  path: str
+  name: str
+  ext: str
+  size: int
+  mtime_ns: int
+  content_hash: str
+  changed: bool = True  # new, or content differs from the stored fingerprint
+
+
+@dataclass
+class DirectoryScan:
+  base_dir: str
+  files: List[FileEntry] = field(default_factory=list)
+  structure: Dict[str, Any] = field(default_factory=dict)
+  removed: List[str] = field(default_factory=list)
+
+  @property
+  def changed(self) -> List[FileEntry]:
+    return [entry for entry in self.files if entry.changed]
+
+  def summary(self) -> str:
+    return (f"{len(self.files)} files, {len(self.changed)} new or changed, "
+            f"{len(self.removed)} removed")
+
+
+def hash_file(path: str) -> str:
+  digest = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(1 << 20), b""):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+class FingerprintStore:
+  """
+    Persisted path -> (size, mtime_ns, content hash). A file whose size and
+    mtime match its stored entry reuses the stored hash without being read.
+  """
+
+  def __init__(self, path: Optional[str] = None):
+    self.path = path
+    self.entries: Dict[str, Tuple[int, int, str]] = {}
+    if path and os.path.exists(path):
+      with open(path, 'r', encoding='utf-8') as f:
+        self.entries = {
+          file_path: tuple(entry) for file_path, entry in json.load(f).items()
+        }
+
+  def save(self):
+    if not self.path:
+      return
+
+    def write(tmp_path):
+      with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(self.entries, f)
+
+    storage.replace_atomically(self.path, write)
+
+
+def scan_directory(base_dir: str, fingerprints: Optional[FingerprintStore] = None) -> DirectoryScan:
+  """
+    One os.scandir traversal producing the file list (in os.walk order),
+    the nested directory-structure dict DocumentUtils.get_directory_structure
+    builds, and a (size, mtime, content hash) fingerprint per file. Only
+    files whose size or mtime moved since the stored fingerprint are hashed.
+    The fingerprint store is updated in place; call save() to persist it.
+  """
+  base_dir = os.path.abspath(base_dir)
+  fingerprints = fingerprints or FingerprintStore()
+  previous = fingerprints.entries
+  scan = DirectoryScan(base_dir=base_dir)
+  seen = set()
+
+  def visit(directory: str, structure: Dict[str, Any]):
+    files = []
+    subdirs = []
+    with os.scandir(directory) as entries:
+      for entry in entries:
+        if entry.is_dir(follow_symlinks=False):  # os.walk doesn't descend into links either
+          subdirs.append(entry)
+        elif entry.is_file():
+          files.append(entry)
+
+    names = []
+    for entry in files:
+      stat = entry.stat()
+      stored = previous.get(entry.path)
+      if stored and stored[0] == stat.st_size and stored[1] == stat.st_mtime_ns:
+        content_hash = stored[2]
+      else:
+        content_hash = hash_file(entry.path)
+
+      scan.files.append(FileEntry(
+        path=entry.path,
+        name=entry.name,
+        ext=os.path.splitext(entry.name)[1].lower(),
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        content_hash=content_hash,
+        changed=not stored or stored[2] != content_hash
+      ))
+      previous[entry.path] = (stat.st_size, stat.st_mtime_ns, content_hash)
+      seen.add(entry.path)
+      names.append(entry.name)
+
+    if names:
+      structure['documents'] = names
+
+    for entry in subdirs:
+      visit(entry.path, structure.setdefault(entry.name, {}))
+
+  visit(base_dir, scan.structure)
+
+  prefix = base_dir + os.sep
+  scan.removed = [
+    path for path in previous if path.startswith(prefix) and path not in seen]
+  for path in scan.removed:
+    del previous[path]
+
+  return scan
@@ -1,5 +1,5 @@
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 
 from langchain_community.document_loaders import TextLoader, UnstructuredMarkdownLoader, JSONLoader
@@ -13,8 +13,12 @@ from documents.pdf_processor import PdfProcessor
 from documents.json_processor import JsonProcessor
 
 from documents.document_utils import DocumentUtils
+from documents.parallel_ingest import process_files, print_report
+from documents.chunk_dataset import ChunkDatasetWriter
+from documents.directory_scanner import FingerprintStore, scan_directory
+from documents.chunk_cache import ChunkCache
 
-from config import DEF_CHUNK_OVERLAP, DEF_CHUNK_SIZE
+from config import DEF_CHUNK_OVERLAP, DEF_CHUNK_SIZE, CHUNK_WORKERS, FINGERPRINT_DIR, CHUNK_CACHE_PATH
 
 
 class DocumentChunker:
@@ -23,11 +27,19 @@ class DocumentChunker:
     document_config_file: str,
     chunk_size: int = DEF_CHUNK_SIZE,
     chunk_overlap: int = DEF_CHUNK_OVERLAP,
-    supported_file_types: List[str] = ['.pdf', '.md', '.json', '.txt']
+    supported_file_types: List[str] = ['.pdf', '.md', '.json', '.txt'],
+    workers: int = CHUNK_WORKERS,
+    fingerprint_file: Optional[str] = f"{FINGERPRINT_DIR}/documents.json",
+    chunk_cache_file: Optional[str] = CHUNK_CACHE_PATH
   ):
     self.chunk_size = chunk_size
     self.chunk_overlap = chunk_overlap
     self.supported_file_types = supported_file_types
+    self.workers = workers
+    # Size / mtime / content hash of every scanned file, kept between runs
+    self.fingerprints = FingerprintStore(fingerprint_file)
+    self.chunk_cache = ChunkCache(chunk_cache_file) if chunk_cache_file else None
+    self.failed_files: List[str] = []
 
     # Initialize
     self.text_splitter = RecursiveCharacterTextSplitter(
@@ -41,37 +53,64 @@ class DocumentChunker:
 
   def process_directory(
     self,
-    directory_path: str
+    directory_path: str,
+    writer: Optional[ChunkDatasetWriter] = None
   ) -> Dict[str, Any]:
-    """Process all files in a directory and its subdirectories"""
+    """
+      Process all files in a directory and its subdirectories. With a writer,
+      each document is streamed to it as soon as it is processed and the
+      returned dataset carries only the metadata.
+    """
 
     processed_docs = []
     subjects = set()
+    total_documents = 0
     total_chunks = 0
 
     base_dir = os.path.abspath(directory_path)
 
-    for root, _, files in os.walk(base_dir):
-      for file in files:
-        file_path = os.path.join(root, file)
-        file_ext = os.path.splitext(file)[1].lower()
-
-        if file_ext not in self.supported_file_types:
-          continue
-
-        subject = DocumentUtils.get_subject_from_path(file_path, base_dir)
-
-        processed_doc = self.process_document(
-          file, file_path, file_ext, subject)
-
-        if not processed_doc:
-          print(f"Warn: didn't get a processed doc for {directory_path}")
-          continue
-
+    scan = scan_directory(base_dir, self.fingerprints)
+    print(f"Scanned {base_dir}: {scan.summary()}")
+
+    tasks = []
+    keys = []
+    for entry in scan.files:
+      if entry.ext not in self.supported_file_types:
+        continue
+
+      subject = DocumentUtils.get_subject_from_path(entry.path, base_dir)
+      tasks.append((entry.name, entry.path, entry.ext, subject, entry.size))
+      keys.append(ChunkCache.key(
+        content_hash=entry.content_hash,
+        processor=f"document{entry.ext}",
+        chunk_size=self.chunk_size,
+        chunk_overlap=self.chunk_overlap,
+        config=self.get_config(entry.name),
+        file_path=entry.path,
+        subject=subject
+      ))
+
+    results = []
+    for result in process_files(self, tasks, self.workers, self.chunk_cache, keys):
+      processed_doc = result.processed_doc
+      result.processed_doc = None  # keep only the timings for the report
+      results.append(result)
+      if not processed_doc:
+        print(f"Warn: didn't get a processed doc for {result.file_path}")
+        continue
+
+      if writer:
+        writer.write_document(processed_doc)
+      else:
         processed_docs.append(processed_doc)
-        total_chunks += len(processed_doc["chunks"])
+      total_documents += 1
+      total_chunks += len(processed_doc["chunks"])
 
-        subjects.update(processed_doc["metadata"]["subjects"])
+      subjects.update(processed_doc["metadata"]["subjects"])
+
+    print_report(results, base_dir)
+    # Read by the pipeline so a run with failed files isn't recorded as done
+    self.failed_files = [result.file_path for result in results if result.error]
 
     # Create dataset with directory structure information
     dataset = {
@@ -79,33 +118,44 @@ class DocumentChunker:
             "creation_date": datetime.now(timezone.utc).isoformat(),
             "chunk_size": self.chunk_size,
             "chunk_overlap": self.chunk_overlap,
-            "total_documents": len(processed_docs),
+            "total_documents": total_documents,
             "total_chunks": total_chunks,
             "subjects": sorted(list(subjects)),
-            "directory_structure": DocumentUtils.get_directory_structure(base_dir)
+            "directory_structure": scan.structure
         },
         "documents": processed_docs
     }
 
+    if writer:
+      writer.write_metadata(dataset["metadata"])
+
+    self.fingerprints.save()
+
     return dataset
 
+  def get_config(self, file_name: str) -> Optional[Dict[str, Any]]:
+    return next(
+      (entry for entry in self.config if entry['document'] == file_name),
+      None
+    )
+
   def process_document(
     self,
     file_name: str,
     file_path: str,
     file_ext: str,
-    subject: str
+    subject: str,
+    file_size: Optional[int] = None
   ) -> Dict[str, Any]:
     """Process a single document into chunks with metadata"""
 
     content_type = None
     priority = 0
 
-    for entry in self.config:
-      if entry['document'] == file_name:
-        priority = entry.get('priority', 0)
-        content_type = entry.get('content_type')
-        break
+    entry = self.get_config(file_name)
+    if entry:
+      priority = entry.get('priority', 0)
+      content_type = entry.get('content_type')
 
     try:
       match file_ext:
@@ -215,7 +265,8 @@ class DocumentChunker:
             "subjects": list(unique_subjects),
             "creation_date": datetime.now(timezone.utc).isoformat(),
             "total_chunks": len(chunks),
-            "original_size": os.path.getsize(file_path) if os.path.exists(file_path) else None
+            "original_size": file_size if file_size is not None else (
+              os.path.getsize(file_path) if os.path.exists(file_path) else None)
         },
     }
 
@@ -1,9 +1,11 @@
 import json
-from typing import List, Dict, Tuple
-import re
+from typing import List, Dict, Tuple, Iterable, Optional
+from functools import cached_property
 import asyncio
 
 from documents.document_utils import DocumentUtils
+from documents.chunk_index import ChunkTokenIndex
+from documents.chunk_dataset import ChunkStream
 
 
 class DocumentPreparation:
@@ -18,46 +20,27 @@ class DocumentPreparation:
 
     self.questions = DocumentUtils.load_from_json(questions_file)
     self.services = DocumentUtils.load_from_json(services_file)
-    self.documents = DocumentUtils.load_from_json(documents_file)
-    self.projects = DocumentUtils.load_from_json(projects_file)
 
-    self.chunks = []
-    for document in self.documents['documents']:
-      for chunk in document['chunks']:
-        self.chunks.append(chunk)
+    # JSONL datasets are streamed on each pass rather than held in memory
+    self.chunks = ChunkStream([documents_file, projects_file])
 
-    for document in self.projects['documents']:
-      for chunk in document['chunks']:
-        self.chunks.append(chunk)
+  @cached_property
+  def chunk_index(self) -> ChunkTokenIndex:
+    return ChunkTokenIndex(self.chunks)
 
-  def find_relevant_chunks(self, text: str, overlap: float = 0.3) -> List[str]:
-    """Find relevant chunks for a peice of text"""
+  @cached_property
+  def service_index(self) -> Dict[str, Tuple[List[str], List[str], List[str]]]:
+    return self.index_services(self.chunks)
 
-    relevant_chunk_ids = []
-    for chunk in self.chunks:
-      should_include = False
-      chunk_content = chunk.get('content', '').lower()
-      chunk_client = chunk.get('client_name', '').lower()
-
-      if chunk_client and chunk_client in text:
-        should_include = True
-
-      content_words = set(re.findall(r'\b\w+\b', chunk_content))
-      test_words = set(re.findall(r'\b\w+\b', text))
-
-      # Calculate word overlap ratio
-      if len(content_words) > 0 and len(test_words) > 0:
-        overlap = len(content_words.intersection(test_words))
-        content_ratio = overlap / len(content_words)
-
-        # If there's significant word overlap (adjust threshold as needed)
-        if content_ratio > overlap:  # 30% overlap threshold
-          should_include = True
-
-      if should_include:
-        relevant_chunk_ids.append(chunk['chunk_id'])
-
-    return relevant_chunk_ids
+  def find_relevant_chunks(self, text: str, overlap: Optional[float] = None) -> List[str]:
+    """
+      Find relevant chunks for a peice of text: those whose client name occurs
+      in it. The original word-overlap test compared the ratio against the
+      shadowed overlap count and never matched, so it only applies when an
+      overlap threshold is passed explicitly.
+    """
+    chunk_ids = self.chunk_index.chunk_ids
+    return [chunk_ids[position] for position in self.chunk_index.match(text, overlap)]
 
   def update_questions_with_chunks(self) -> List[Dict]:
     """Update questions with relevant chunks"""
@@ -69,18 +52,30 @@ class DocumentPreparation:
 
     return self.questions
 
-  def find_relevant_projects(self, text: str) -> List[str]:
-    correct_chunks = []
-    project_ids = []
-    client_ids = []
-    for chunk in self.chunks:
-      if text in chunk['services']:
-        if 'content_type' in chunk and chunk['content_type'] == 'project':
-          project_ids.append(chunk['project_id'])
-          correct_chunks.append(chunk['chunk_id'])
-          client_ids.append(chunk['client_id'])
-
-    return correct_chunks, project_ids, client_ids
+  @staticmethod
+  def index_services(chunks: Iterable[Dict]) -> Dict[str, Tuple[List[str], List[str], List[str]]]:
+    """
+      One pass over the project chunks: service -> (chunk_ids, project_ids,
+      client_ids). Ids are deduplicated as they are added, keeping first-seen order.
+    """
+    index = {}
+    for chunk in chunks:
+      if chunk.get('content_type') != 'project':
+        continue
+      for service in dict.fromkeys(chunk.get('services', [])):
+        chunk_ids, project_ids, client_ids = index.setdefault(service, ({}, {}, {}))
+        chunk_ids[chunk['chunk_id']] = None
+        project_ids[chunk['project_id']] = None
+        client_ids[chunk['client_id']] = None
+
+    return {
+      service: (list(chunk_ids), list(project_ids), list(client_ids))
+      for service, (chunk_ids, project_ids, client_ids) in index.items()
+    }
+
+  def find_relevant_projects(self, text: str) -> Tuple[List[str], List[str], List[str]]:
+    correct_chunks, project_ids, client_ids = self.service_index.get(text, ([], [], []))
+    return list(correct_chunks), list(project_ids), list(client_ids)
 
   def update_services_with_chunks(self) -> List[Dict]:
     """Update services with relevant chunks"""
@@ -89,11 +84,12 @@ class DocumentPreparation:
       correct_chunks, project_ids, client_ids = self.find_relevant_projects(
         service['title'])
       service['correct_chunks'] = correct_chunks
-      service['project_ids'] = list(set(project_ids))
-      service['client_ids'] = list(set(client_ids))
+      service['project_ids'] = project_ids
+      service['client_ids'] = client_ids
     return self.services
 
-  def get_all_chunks(self) -> List[Dict]:
+  def get_all_chunks(self) -> Iterable[Dict]:
+    """Lazy, re-iterable stream of every document and project chunk"""
     return self.chunks
 
 
@@ -0,0 +1,281 @@
+import re
+from typing import List, Dict, Iterator, Tuple
+from urllib.parse import urlparse
+
+from langchain_core.documents import Document
+
+from documents.rich_media_text_splitter import (
+  MediaElement, DocumentMetadata, PLACEHOLDER_PATTERN, media_id
+)
+
+DEF_CHUNK_SIZE = 600
+DEF_CHUNK_OVERLAP = 40
+
+FRONTMATTER_REGEX = re.compile(r'^---\n.*?\n---\n', re.DOTALL)
+
+# Lines dropped while cleaning: Google Docs separators (prefix match) and
+# separator rules / empty headers / horizontal rules (whole line)
+SEPARATOR_LINE_REGEX = re.compile(r'\*{0,2}\\\\\_+_?\*{0,2}|\*{0,2}\\_+_?\*{0,2}')
+NOISE_LINE_REGEX = re.compile(r'[_*\-=]{10,}|#+\s*|[-_*]{3,}')
+
+# Metadata links, images and inline links, replaced in that order so an
+# image inside a link ([![alt](img)](url)) is taken as an image first
+META_LINK_REGEX = re.compile(r'\{meta_link:\s*(.*?)\}\[(.*?)\]')
+IMAGE_REGEX = re.compile(r'!\[(.*?)\]\((.*?)\)')
+# Link text may hold an image left in place (relative url), brackets and all
+LINK_REGEX = re.compile(r'\[((?:!\[[^\]]*\]\([^)]*\)|.)*?)\]\((.*?)\)')
+
+HEADERS = [("###", "header_3"), ("##", "header_2"), ("#", "header_1")]
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+class MarkdownChunker:
+  """
+    One-pass replacement for frontmatter removal -> line cleaning ->
+    MarkdownHeaderTextSplitter -> RichMediaTextSplitter.
+
+    Each line is cleaned and classified once while header context is
+    tracked, metadata links, images and links are replaced in each header
+    section, and the section is split to chunk_size with the same
+    recursive separators and overlap as RecursiveCharacterTextSplitter.
+    Chunks carry the same media_elements / document_metadata /
+    chunk_metadata shape ProjectChunker reads from RichMediaTextSplitter,
+    with media_elements holding only the media whose placeholders fall in
+    the chunk.
+  """
+
+  def __init__(
+    self,
+    chunk_size: int = DEF_CHUNK_SIZE,
+    chunk_overlap: int = DEF_CHUNK_OVERLAP,
+    remove_metadata: bool = True
+  ):
+    self.chunk_size = chunk_size
+    self.chunk_overlap = chunk_overlap
+    self.remove_metadata = remove_metadata
+
+  @staticmethod
+  def _is_valid_url(url: str) -> bool:
+    # Same rule as RichMediaTextSplitter._is_valid_url
+    try:
+      result = urlparse(url)
+      return all([result.scheme, result.netloc])
+    except ValueError:
+      return False
+
+  def iter_sections(self, text: str) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+      Cleaned header sections as (content, header metadata), matching
+      MarkdownHeaderTextSplitter over the cleaned lines: lines are
+      stripped, blank lines end a block, headers are dropped from content
+      and consecutive blocks under the same headers are joined by "  \\n".
+    """
+    if self.remove_metadata:
+      text = FRONTMATTER_REGEX.sub('', text, count=1)
+
+    blocks: List[Tuple[str, Dict[str, str]]] = []
+    current_content: List[str] = []
+    current_metadata: Dict[str, str] = {}
+    header_stack: List[Tuple[int, str]] = []
+    headers: Dict[str, str] = {}
+    in_code_block = False
+    opening_fence = ""
+
+    def flush(metadata):
+      content = "\n".join(current_content)
+      current_content.clear()
+      # Aggregate with the previous block when it sits under the same headers
+      if blocks and blocks[-1][1] == metadata:
+        blocks[-1] = (blocks[-1][0] + "  \n" + content, metadata)
+      else:
+        blocks.append((content, metadata))
+
+    for line in text.splitlines():
+      if SEPARATOR_LINE_REGEX.match(line) or NOISE_LINE_REGEX.fullmatch(line):
+        continue
+
+      stripped = "".join(filter(str.isprintable, line.strip()))
+
+      if not in_code_block:
+        if stripped.startswith("```") and stripped.count("```") == 1:
+          in_code_block = True
+          opening_fence = "```"
+        elif stripped.startswith("~~~"):
+          in_code_block = True
+          opening_fence = "~~~"
+      elif stripped.startswith(opening_fence):
+        in_code_block = False
+        opening_fence = ""
+
+      if in_code_block:
+        current_content.append(stripped)
+        continue
+
+      for marker, name in HEADERS:
+        if stripped.startswith(marker) and (
+            len(stripped) == len(marker) or stripped[len(marker)] == " "):
+          level = len(marker)
+          while header_stack and header_stack[-1][0] >= level:
+            headers.pop(header_stack.pop()[1], None)
+          header_stack.append((level, name))
+          headers[name] = stripped[len(marker):].strip()
+          if current_content:
+            flush(current_metadata)
+          break
+      else:
+        if stripped:
+          current_content.append(stripped)
+        elif current_content:
+          flush(current_metadata)
+
+      current_metadata = dict(headers)
+
+    if current_content:
+      flush(current_metadata)
+
+    return iter(blocks)
+
+  def extract_media(self, text: str, metadata: DocumentMetadata) -> Tuple[str, List[MediaElement]]:
+    """Replace media with {{MEDIA_n}} placeholders and collect references"""
+    media_elements: List[MediaElement] = []
+
+    def replace_meta_link(match):
+      if self._is_valid_url(match.group(2)):
+        metadata.references.append({
+          'description': match.group(1),
+          'url': match.group(2)
+        })
+      return ''  # Remove metadata links from main text
+
+    def replacer(kind, extra):
+      def replace(match):
+        label, url = match.group(1), match.group(2)
+        if not self._is_valid_url(url):
+          return match.group(0)
+
+        media_elements.append(MediaElement(
+          type=kind,
+          position=len(media_elements),
+          url=url,
+          text=label,
+          metadata=extra,
+          id=media_id(kind, url, label)
+        ))
+        return f"{{{{MEDIA_{len(media_elements) - 1}}}}}"
+      return replace
+
+    text = META_LINK_REGEX.sub(replace_meta_link, text)
+    text = IMAGE_REGEX.sub(replacer('image', {'content_type': 'image'}), text)
+    text = LINK_REGEX.sub(replacer('link', {'link_type': 'inline'}), text)
+    return text, media_elements
+
+  @staticmethod
+  def render_media(element: MediaElement) -> str:
+    if element.type == 'image':
+      return f"![{element.text or ''}]({element.url})"
+    return f"[{element.text or element.url}]({element.url})"
+
+  def _split(self, text: str, separators: List[str]) -> List[str]:
+    """RecursiveCharacterTextSplitter._split_text with keep_separator="start" """
+    separator = separators[-1]
+    remaining: List[str] = []
+    for i, candidate in enumerate(separators):
+      if candidate == "":
+        separator = candidate
+        break
+      if candidate in text:
+        separator = candidate
+        remaining = separators[i + 1:]
+        break
+
+    if separator:
+      parts = text.split(separator)
+      splits = [parts[0]] + [separator + part for part in parts[1:]]
+    else:
+      splits = list(text)
+    splits = [split for split in splits if split != ""]
+
+    chunks: List[str] = []
+    good: List[str] = []
+    for split in splits:
+      if len(split) < self.chunk_size:
+        good.append(split)
+        continue
+      if good:
+        chunks.extend(self._merge(good))
+        good = []
+      if not remaining:
+        chunks.append(split)
+      else:
+        chunks.extend(self._split(split, remaining))
+    if good:
+      chunks.extend(self._merge(good))
+    return chunks
+
+  def _merge(self, splits: List[str]) -> List[str]:
+    """RecursiveCharacterTextSplitter._merge_splits; separators are kept on the splits"""
+    chunks: List[str] = []
+    current: List[str] = []
+    total = 0
+    for split in splits:
+      length = len(split)
+      if total + length > self.chunk_size and current:
+        chunk = "".join(current).strip()
+        if chunk:
+          chunks.append(chunk)
+        # Keep a tail of up to chunk_overlap characters as the next chunk's start
+        while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+          total -= len(current.pop(0))
+      current.append(split)
+      total += length
+
+    chunk = "".join(current).strip()
+    if chunk:
+      chunks.append(chunk)
+    return chunks
+
+  def chunk(self, text: str) -> List[Document]:
+    chunks = []
+    for content, headers in self.iter_sections(text):
+      metadata = DocumentMetadata(**headers)
+      metadata.references = []
+      processed_text, media_elements = self.extract_media(content, metadata)
+      rendered: List[str] = []
+      nested: List[List[int]] = []
+      for element in media_elements:
+        # A linked image leaves its placeholder in the link's text; images
+        # are numbered first, so it is already rendered
+        inner = [int(index) for index in PLACEHOLDER_PATTERN.findall(element.text or '')]
+        if inner:
+          element.text = PLACEHOLDER_PATTERN.sub(
+            lambda match: rendered[int(match.group(1))], element.text)
+          element.id = media_id(element.type, element.url, element.text)
+        nested.append(inner)
+        rendered.append(self.render_media(element))
+      document_metadata = metadata.to_dict()
+
+      for position, piece in enumerate(self._split(processed_text, SEPARATORS)):
+        # Placeholders seen while restoring are exactly the chunk's media,
+        # plus any image linked from inside one of them
+        in_chunk = {}
+
+        def restore(match):
+          index = int(match.group(1))
+          for inner in nested[index]:
+            in_chunk.setdefault(inner, None)
+          in_chunk.setdefault(index, None)
+          return rendered[index]
+
+        page_content = PLACEHOLDER_PATTERN.sub(restore, piece)
+        chunks.append(Document(
+          page_content=page_content,
+          metadata={
+            'media_elements': [vars(media_elements[index]) for index in in_chunk],
+            'document_metadata': document_metadata,
+            'chunk_metadata': {
+              'position': position,
+              'total_media_elements': len(in_chunk)
+            }
+          }
+        ))
+    return chunks
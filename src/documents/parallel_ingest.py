@@ -0,0 +1,134 @@
+import os
+import time
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+
+from documents.chunk_cache import ChunkCache
+
+
+@dataclass
+class FileResult:
+  file_path: str
+  processed_doc: Optional[Dict[str, Any]]
+  seconds: float
+  error: Optional[str] = None
+  chunk_count: int = 0
+  cached: bool = False
+
+
+# Set once per worker process by _init_worker so the chunker is pickled per
+# worker rather than per file
+_worker_chunker = None
+
+
+def _init_worker(chunker):
+  global _worker_chunker
+  _worker_chunker = chunker
+
+
+def _process(chunker, args: Tuple) -> FileResult:
+  file_path = args[1]
+  started = time.perf_counter()
+  try:
+    processed_doc = chunker.process_document(*args)
+    return FileResult(
+      file_path,
+      processed_doc,
+      time.perf_counter() - started,
+      chunk_count=len(processed_doc["chunks"]) if processed_doc else 0
+    )
+  except Exception as e:
+    traceback.print_exc()
+    return FileResult(
+      file_path, None, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+
+
+def _process_in_worker(args: Tuple) -> FileResult:
+  return _process(_worker_chunker, args)
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+  """None or 0 means one worker per CPU"""
+  if not workers:
+    return os.cpu_count() or 1
+  return max(1, workers)
+
+
+def _run_tasks(chunker, tasks: List[Tuple], workers: Optional[int]) -> Iterator[FileResult]:
+  workers = min(resolve_workers(workers), len(tasks) or 1)
+  if workers == 1:
+    for task in tasks:
+      yield _process(chunker, task)
+    return
+
+  # Chunk stages may run in threads; forking a threaded process can deadlock
+  start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+  with ProcessPoolExecutor(
+    max_workers=workers,
+    mp_context=multiprocessing.get_context(start_method),
+    initializer=_init_worker,
+    initargs=(chunker,)
+  ) as executor:
+    # map yields in submission order, which keeps the merge deterministic
+    yield from executor.map(_process_in_worker, tasks)
+
+
+def process_files(
+  chunker,
+  tasks: List[Tuple],
+  workers: Optional[int] = 1,
+  cache: Optional[ChunkCache] = None,
+  keys: Optional[List[str]] = None
+) -> Iterator[FileResult]:
+  """
+    Run chunker.process_document(*task) for every task, fanning out to a
+    process pool when workers > 1. Results are yielded in task order whatever
+    order the files finish in, so callers can stream them out one at a time,
+    and a file that raises is recorded as an error instead of aborting the run.
+
+    With a cache and one cache key per task, tasks whose key is already
+    cached are served from it and only the misses are processed. Cached
+    documents are read one at a time as they are yielded.
+  """
+  if cache is None or keys is None:
+    yield from _run_tasks(chunker, tasks, workers)
+    return
+
+  hits = cache.existing(keys)
+  misses = _run_tasks(
+    chunker, [task for task, key in zip(tasks, keys) if key not in hits], workers)
+
+  for task, key in zip(tasks, keys):
+    if key in hits:
+      doc = cache.get(key)
+      if doc is not None:
+        yield FileResult(task[1], doc, 0.0, chunk_count=len(doc["chunks"]), cached=True)
+        continue
+      # Removed from the cache since the lookup
+      result = _process(chunker, task)
+    else:
+      result = next(misses)
+    if result.processed_doc and not result.error:
+      cache.put(key, result.processed_doc)
+    yield result
+
+
+def print_report(results: List[FileResult], base_dir: str):
+  total = sum(result.seconds for result in results)
+  cached = sum(result.cached for result in results)
+  print(f"\nProcessed {len(results)} files, {cached} from cache ({total:.2f}s of processing time)")
+  for result in results:
+    if result.error:
+      status = "error"
+    else:
+      status = f"{result.chunk_count} chunks{' (cached)' if result.cached else ''}"
+    print(f"  {os.path.relpath(result.file_path, base_dir)}: {result.seconds:.2f}s, {status}")
+
+  failed = [result for result in results if result.error]
+  if failed:
+    print(f"\n{len(failed)} files failed:")
+    for result in failed:
+      print(f"  {os.path.relpath(result.file_path, base_dir)}: {result.error}")
@@ -1,6 +1,8 @@
 import json
 import re
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -8,6 +10,8 @@ from dataclasses import dataclass
 
 from documents.document_utils import DocumentUtils
 
+from config import PDF_PAGE_WORKERS
+
 
 @dataclass
 class PageMetadata:
@@ -21,6 +25,12 @@ class PageMetadata:
 DEF_CHUNK_SIZE = 500
 DEF_CHUNK_OVERLAP = 50
 
+TOC_REGEX = re.compile(r'(?i)table\s+of\s+contents')
+TRAILING_NUMBER_REGEX = re.compile(r'\b\d+\b\s*$', re.MULTILINE)
+LEADING_NUMBER_REGEX = re.compile(r'^\s*\b\d+\b', re.MULTILINE)
+HEADER_FOOTER_REGEX = re.compile(r'^\s*(?:\d+\s*)?(?:[A-Za-z\s]+)\s*$', re.MULTILINE)
+WHITESPACE_REGEX = re.compile(r'\s+')
+
 
 class PdfProcessor:
   def __init__(
@@ -31,8 +41,13 @@ class PdfProcessor:
     priority_boost: float = 0.1,
     chunk_size: int = DEF_CHUNK_SIZE,
     chunk_overlap: int = DEF_CHUNK_OVERLAP,
+    page_workers: int = PDF_PAGE_WORKERS,
+    pages_per_batch: int = 16,
   ):
     self.priority_boost = priority_boost
+    # > 1 processes page ranges in a process pool instead of streaming pages in order
+    self.page_workers = page_workers
+    self.pages_per_batch = pages_per_batch
 
     # self.text_splitter = RecursiveCharacterTextSplitter(
     #   chunk_size=chunk_size,
@@ -74,32 +89,55 @@ class PdfProcessor:
 
     self.pdf_path = pdf_path
 
-    loader = PyPDFLoader(pdf_path)
-
-    self.pages = loader.load()
+    # Compiled once: each indicator group is a single alternation, and the
+    # heading patterns combine into one regex tried once per line
+    self._title_page_regex = self._compile_any(self.title_page_indicators, re.MULTILINE)
+    self._end_matter_regex = self._compile_any(self.end_matter_indicators, re.MULTILINE)
+    self._heading_regex = self._compile_any(self.heading_patterns, named=True)
+    # Group holding the heading text for each heading pattern, None = whole line
+    self._heading_groups = {
+      f"p{i}": self._heading_regex.groupindex[f"p{i}"] + 1 if re.compile(pattern).groups else None
+      for i, pattern in enumerate(self.heading_patterns)
+    }
+
+  @staticmethod
+  def _compile_any(patterns: List[str], flags: int = 0, named: bool = False) -> re.Pattern:
+    """
+      One regex matching wherever any of patterns would. Alternatives keep
+      their order, so the first pattern that matches still wins; a leading
+      (?i) becomes a scoped flag so it only applies to its own pattern.
+    """
+    alternatives = []
+    for i, pattern in enumerate(patterns):
+      prefix = f"(?P<p{i}>" if named else "(?:"
+      if pattern.startswith("(?i)"):
+        alternatives.append(f"{prefix}(?i:{pattern[4:]}))")
+      else:
+        alternatives.append(f"{prefix}{pattern})")
+    return re.compile("|".join(alternatives), flags)
+
+  def lazy_load(self) -> Iterator[Document]:
+    """Yield pages one at a time as they are parsed, instead of loading the whole PDF"""
+    return PyPDFLoader(self.pdf_path).lazy_load()
+
+  @cached_property
+  def pages(self) -> List[Document]:
+    """Every page, parsed on first access and kept; processing streams lazy_load instead"""
+    return list(self.lazy_load())
 
   def _process_page(self, content: str, page_number: int):
     """Analyze page content and extract metadata."""
 
     # Is it the first page ?
 
-    is_title_page = any(re.search(pattern, content, re.MULTILINE)
-                        for pattern in self.title_page_indicators)
+    is_title_page = self._title_page_regex.search(content) is not None
 
-    is_end_matter = any(re.search(pattern, content, re.MULTILINE)
-                        for pattern in self.end_matter_indicators)
+    is_end_matter = self._end_matter_regex.search(content) is not None
 
     # Extract headings
-    headings = []
-    for line in content.split('\n'):
-      for pattern in self.heading_patterns:
-        match = re.match(pattern, line.strip())
-        if match:
-          heading = match.group(1) if match.groups() else line.strip()
-          headings.append(heading)
-          break
+    headings = self._extract_headings(content)
 
-    page_type = self._get_page_type(content, is_title_page, is_end_matter)
+    page_type = self._get_page_type(content, is_title_page, is_end_matter, headings)
 
     return PageMetadata(
       page_number=page_number + 1,
@@ -110,24 +148,32 @@ class PdfProcessor:
     )
 
   def _extract_headings(self, content: str) -> List[str]:
-    """Extract headings from page content."""
+    """Extract headings from page content in one pass over its lines."""
     headings = []
+    match_heading = self._heading_regex.match
     for line in content.split('\n'):
-      for pattern in self.heading_patterns:
-        if re.match(pattern, line.strip()):
-          headings.append(line.strip())
-          break
+      line = line.strip()
+      match = match_heading(line)
+      if match:
+        group = self._heading_groups[match.lastgroup]
+        headings.append(match.group(group) if group else line)
     return headings
 
-  def _get_page_type(self, content: str, is_title: bool, is_end: bool) -> str:
+  def _get_page_type(
+    self,
+    content: str,
+    is_title: bool,
+    is_end: bool,
+    headings: Optional[List[str]] = None
+  ) -> str:
     """Determine the type of page based on content analysis."""
     if is_title:
       return 'title_matter'
     elif is_end:
       return 'end_matter'
-    elif re.search(r'(?i)table\s+of\s+contents', content):
+    elif TOC_REGEX.search(content):
       return 'toc'
-    elif len(self._extract_headings(content)) > 0:
+    elif len(headings if headings is not None else self._extract_headings(content)) > 0:
       return 'content'
     else:
       return 'body'
@@ -135,42 +181,84 @@ class PdfProcessor:
   def _clean_page(self, content: str):
     """Clean page content by removing headers, footers, and formatting."""
     # Remove page numbers
-    content = re.sub(r'\b\d+\b\s*$', '', content, flags=re.MULTILINE)
-    content = re.sub(r'^\s*\b\d+\b', '', content, flags=re.MULTILINE)
+    content = TRAILING_NUMBER_REGEX.sub('', content)
+    content = LEADING_NUMBER_REGEX.sub('', content)
 
     # Remove headers and footers (common patterns)
-    content = re.sub(
-      r'^\s*(?:\d+\s*)?(?:[A-Za-z\s]+)\s*$', '', content, flags=re.MULTILINE)
+    content = HEADER_FOOTER_REGEX.sub('', content)
 
-    # Clean up whitespace
-    content = re.sub(r'\s+', ' ', content)
-    content = re.sub(r'\n{3,}', '\n\n', content)
+    # Clean up whitespace. This leaves no newlines, so the old
+    # \n{3,} -> \n\n pass that followed it never matched and is gone
+    content = WHITESPACE_REGEX.sub(' ', content)
 
     return content.strip()
 
-  def process_document(self):
-    chunks = []
+  def _chunk_page(self, page: Document, page_num: int) -> Optional[Document]:
+    metadata = self._process_page(page.page_content, page_num)
+    content = self._clean_page(page.page_content)
+
+    if not content:
+      return None
+
+    return Document(
+      page_content=content,
+      metadata={
+        'source': self.pdf_path,
+        'page': metadata.page_number,
+        'headings': metadata.headings,
+        'page_type': metadata.page_type,
+        # 'title': metadata.title
+      }
+    )
+
+  def _process_page_range(self, page_range: Tuple[int, int]) -> List[Document]:
+    """
+      Extract and chunk pages [start, end) in a worker process. Workers read
+      their pages with pypdf directly (what PyPDFLoader parses with), so
+      only the requested pages are decoded.
+    """
+    import pypdf  # already required by PyPDFLoader
 
-    for page_num, page in enumerate(self.pages):
-      metadata = self._process_page(page.page_content, page_num)
-      content = self._clean_page(page.page_content)
-
-      if not content:
-        continue
-
-      chunk = Document(
-        page_content=content,
-        metadata={
-          'source': self.pdf_path,
-          'page': metadata.page_number,
-          'headings': metadata.headings,
-          'page_type': metadata.page_type,
-          # 'title': metadata.title
-        }
+    start, end = page_range
+    reader = pypdf.PdfReader(self.pdf_path)
+    chunks = []
+    for page_num in range(start, end):
+      page = Document(
+        page_content=reader.pages[page_num].extract_text(),
+        metadata={'source': self.pdf_path, 'page': page_num}
       )
-      chunks.append(chunk)
+      chunk = self._chunk_page(page, page_num)
+      if chunk:
+        chunks.append(chunk)
     return chunks
 
+  def _process_parallel(self) -> Iterator[Document]:
+    import pypdf
+
+    page_count = len(pypdf.PdfReader(self.pdf_path).pages)
+    page_ranges = [
+      (start, min(start + self.pages_per_batch, page_count))
+      for start in range(0, page_count, self.pages_per_batch)
+    ]
+    with ProcessPoolExecutor(max_workers=self.page_workers) as executor:
+      # map keeps page order
+      for chunks in executor.map(self._process_page_range, page_ranges):
+        yield from chunks
+
+  def iter_chunks(self, pages: Optional[Iterable[Document]] = None) -> Iterator[Document]:
+    """Chunk pages as they arrive, so at most one parsed page is held at a time"""
+    if pages is None and self.page_workers > 1:
+      yield from self._process_parallel()
+      return
+
+    for page_num, page in enumerate(pages if pages is not None else self.lazy_load()):
+      chunk = self._chunk_page(page, page_num)
+      if chunk:
+        yield chunk
+
+  def process_document(self):
+    return list(self.iter_chunks())
+
 
 if __name__ == "__main__":
 
@@ -1,5 +1,5 @@
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 from enum import Enum
 import hashlib
@@ -12,6 +12,12 @@ from documents.markdown_processor import MarkdownProcessor
 from documents.json_processor import JsonProcessor
 
 from documents.document_utils import DocumentUtils
+from documents.parallel_ingest import process_files, print_report
+from documents.chunk_dataset import ChunkDatasetWriter
+from documents.directory_scanner import FingerprintStore, scan_directory
+from documents.chunk_cache import ChunkCache
+
+from config import CHUNK_WORKERS, FINGERPRINT_DIR, CHUNK_CACHE_PATH
 
 
 DEF_CHUNK_SIZE = 1000
@@ -57,12 +63,20 @@ class ProjectChunker:
     client_config_file,
     chunk_size: int = DEF_CHUNK_SIZE,
     chunk_overlap: int = DEF_CHUNK_OVERLAP,
-    supported_file_types: List[str] = ['.md', '.json']
+    supported_file_types: List[str] = ['.md', '.json'],
+    workers: int = CHUNK_WORKERS,
+    fingerprint_file: Optional[str] = f"{FINGERPRINT_DIR}/projects.json",
+    chunk_cache_file: Optional[str] = CHUNK_CACHE_PATH
   ):
 
     self.chunk_size = chunk_size
     self.chunk_overlap = chunk_overlap
     self.supported_file_types = supported_file_types
+    self.workers = workers
+    # Size / mtime / content hash of every scanned file, kept between runs
+    self.fingerprints = FingerprintStore(fingerprint_file)
+    self.chunk_cache = ChunkCache(chunk_cache_file) if chunk_cache_file else None
+    self.failed_files: List[str] = []
 
     self.text_splitter = RecursiveCharacterTextSplitter(
       chunk_size=chunk_size,
@@ -76,37 +90,64 @@ class ProjectChunker:
 
   def process_directory(
     self,
-    directory_path: str
+    directory_path: str,
+    writer: Optional[ChunkDatasetWriter] = None
   ) -> Dict[str, Any]:
-    """Process all files in a directory and its subdirectories"""
+    """
+      Process all files in a directory and its subdirectories. With a writer,
+      each document is streamed to it as soon as it is processed and the
+      returned dataset carries only the metadata.
+    """
 
     processed_docs = []
     services = set()
     clients = set()
+    total_documents = 0
     total_chunks = 0
 
     base_dir = os.path.abspath(directory_path)
 
-    for root, _, files in os.walk(base_dir):
-      for file in files:
-        file_path = os.path.join(root, file)
-        file_ext = os.path.splitext(file)[1].lower()
-
-        if file_ext not in self.supported_file_types:
-          continue
-
-        processed_doc = self.process_document(
-          file, file_path, file_ext)
-
-        if not processed_doc:
-          print(f"Warn: didn't get a processed doc for {directory_path}")
-          continue
+    scan = scan_directory(base_dir, self.fingerprints)
+    print(f"Scanned {base_dir}: {scan.summary()}")
+
+    tasks = []
+    keys = []
+    for entry in scan.files:
+      if entry.ext not in self.supported_file_types:
+        continue
+
+      tasks.append((entry.name, entry.path, entry.ext, entry.size))
+      keys.append(ChunkCache.key(
+        content_hash=entry.content_hash,
+        processor=f"project{entry.ext}",
+        chunk_size=self.chunk_size,
+        chunk_overlap=self.chunk_overlap,
+        config=self.find_config(entry.name),
+        file_path=entry.path
+      ))
 
+    results = []
+    for result in process_files(self, tasks, self.workers, self.chunk_cache, keys):
+      processed_doc = result.processed_doc
+      result.processed_doc = None  # keep only the timings for the report
+      results.append(result)
+      if not processed_doc:
+        print(f"Warn: didn't get a processed doc for {result.file_path}")
+        continue
+
+      if writer:
+        writer.write_document(processed_doc)
+      else:
         processed_docs.append(processed_doc)
-        total_chunks += len(processed_doc["chunks"])
+      total_documents += 1
+      total_chunks += len(processed_doc["chunks"])
 
-        services.update(processed_doc["metadata"]["services"])
-        clients.update(processed_doc["metadata"]["clients"])
+      services.update(processed_doc["metadata"]["services"])
+      clients.update(processed_doc["metadata"]["clients"])
+
+    print_report(results, base_dir)
+    # Read by the pipeline so a run with failed files isn't recorded as done
+    self.failed_files = [result.file_path for result in results if result.error]
 
     # Create dataset with directory structure information
     dataset = {
@@ -114,17 +155,40 @@ class ProjectChunker:
             "creation_date": datetime.now(timezone.utc).isoformat(),
             "chunk_size": self.chunk_size,
             "chunk_overlap": self.chunk_overlap,
-            "total_documents": len(processed_docs),
+            "total_documents": total_documents,
             "total_chunks": total_chunks,
             "services": sorted(list(services)),
             "clients": sorted(list(clients)),
-            "directory_structure": DocumentUtils.get_directory_structure(base_dir)
+            "directory_structure": scan.structure
         },
         "documents": processed_docs
     }
 
+    if writer:
+      writer.write_metadata(dataset["metadata"])
+
+    self.fingerprints.save()
+
     return dataset
 
+  def find_config(self, file_name):
+    """get_config without the warnings, used to key the chunk cache"""
+    # Find the document config
+    doc_config = next(
+        (entry for entry in self.project_config if entry.get('document') == file_name),
+        None
+    )
+    if not doc_config:
+      return None, None
+
+    # Find the client config that includes the project's ID
+    client_config = next(
+        (entry for entry in self.client_config if entry.get('client_id')
+         == doc_config['client_id']),
+        None
+    )
+    return doc_config, client_config
+
   def get_config(self, file_name):
     """
     Retrieves document and client configuration based on the given file name.
@@ -136,24 +200,13 @@ class ProjectChunker:
         tuple: (doc_config, client_config), where doc_config is the matching project config
                 and client_config is the associated client config.
     """
-    # Find the document config
-    doc_config = next(
-        (entry for entry in self.project_config if entry.get('document') == file_name),
-        None
-    )
+    doc_config, client_config = self.find_config(file_name)
 
     if not doc_config:
       print(f"Warn: No project config found for {file_name}")
       print(self.project_config)
       return None, None  # Return explicit None values to indicate failure
 
-    # Find the client config that includes the project's ID
-    client_config = next(
-        (entry for entry in self.client_config if entry.get('client_id')
-         == doc_config['client_id']),
-        None
-    )
-
     if not client_config:
       print(
           f"Warn: No client config found for project ID {doc_config['project_id']}")
@@ -164,7 +217,8 @@ class ProjectChunker:
     self,
     file_name: str,
     file_path: str,
-    file_ext: str
+    file_ext: str,
+    file_size: Optional[int] = None
   ) -> Dict[str, Any]:
     """Process a single project document into chunks with metadata"""
     chunks = []
@@ -257,7 +311,8 @@ class ProjectChunker:
             "clients": list(unique_clients),
             "creation_date": datetime.now(timezone.utc).isoformat(),
             "total_chunks": len(chunks),
-            "original_size": os.path.getsize(file_path) if os.path.exists(file_path) else None
+            "original_size": file_size if file_size is not None else (
+              os.path.getsize(file_path) if os.path.exists(file_path) else None)
         },
           }
 
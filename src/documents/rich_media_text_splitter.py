@@ -4,6 +4,7 @@ from langchain.schema import Document
 from typing import List, Dict, Any, Optional
 import json
 import re
+import hashlib
 from dataclasses import dataclass
 from urllib.parse import urlparse
 
@@ -16,6 +17,21 @@ class MediaElement:
   # alt: Optional[str] = None
   text: Optional[str] = None
   metadata: Dict[str, Any] = None
+  # Stable key for the element, the same wherever it appears
+  id: Optional[str] = None
+
+
+def media_id(media_type: str, url: str, text: Optional[str]) -> str:
+  return hashlib.md5(f"{media_type}\n{url}\n{text or ''}".encode()).hexdigest()
+
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{MEDIA_(\d+)\}\}')
+
+
+def media_in_chunk(text: str, media_elements: List[MediaElement]) -> List[MediaElement]:
+  """The media whose placeholders occur in text, in order of first appearance"""
+  positions = dict.fromkeys(int(index) for index in PLACEHOLDER_PATTERN.findall(text))
+  return [media_elements[position] for position in positions]
 
 
 @dataclass
@@ -89,6 +105,7 @@ class RichMediaTextSplitter:
             position=len(media_elements),
             url=match.group(2),
             text=match.group(1),
+            id=media_id('image', match.group(2), match.group(1)),
             metadata={'content_type': 'image'}
         ))
         index = len(media_elements) - 1
@@ -105,6 +122,7 @@ class RichMediaTextSplitter:
             position=len(media_elements),
             url=match.group(2),
             text=match.group(1),
+            id=media_id('link', match.group(2), match.group(1)),
             metadata={'link_type': 'inline'}
         ))
         index = len(media_elements) - 1
@@ -147,13 +165,15 @@ class RichMediaTextSplitter:
     # Restore media elements in each chunk and enrich metadata
     enriched_chunks = []
     for chunk in chunks:
-      restored_text = self.restore_media(chunk.page_content, media_elements)
+      # Only the media this chunk actually contains, not the whole document's
+      chunk_media = media_in_chunk(chunk.page_content, media_elements)
+      restored_text = self.restore_media(chunk.page_content, chunk_media)
       chunk_metadata = {
-          'media_elements': [vars(m) for m in media_elements],
+          'media_elements': [vars(m) for m in chunk_media],
           'document_metadata': metadata.to_dict(),
           'chunk_metadata': {
               'position': len(enriched_chunks),
-              'total_media_elements': len(media_elements)
+              'total_media_elements': len(chunk_media)
           }
       }
       enriched_chunks.append(Document(
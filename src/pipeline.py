@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from vectorstore import storage
+from documents.directory_scanner import FingerprintStore, scan_directory, hash_file
+
+
+def fingerprint_path(path: str, fingerprints: Optional[FingerprintStore] = None) -> str:
+  """
+    Content fingerprint of a file, or of every file under a directory. With a
+    fingerprint store, files whose size and mtime are unchanged aren't re-read.
+  """
+  if not os.path.exists(path):
+    return "missing"
+  if os.path.isfile(path):
+    return hash_file(path)
+
+  digest = hashlib.sha256()
+  for entry in sorted(scan_directory(path, fingerprints).files, key=lambda entry: entry.path):
+    digest.update(os.path.relpath(entry.path, path).encode('utf-8'))
+    digest.update(entry.content_hash.encode('utf-8'))
+  return digest.hexdigest()
+
+
+class StageIncomplete(Exception):
+  """
+    Raised by a stage that finished but with failures (files that failed to
+    chunk, vectors that failed to upsert). Its inputs are not recorded, so
+    the next run retries it.
+  """
+
+
+@dataclass
+class Stage:
+  """
+    A unit of work in the pipeline. A stage runs again only when the
+    fingerprint of its inputs changes: source files / directories, config
+    JSONs, the outputs of the stages it depends on, and its params.
+  """
+  name: str
+  run: Callable[[], Any]
+  sources: List[str] = field(default_factory=list)
+  configs: List[str] = field(default_factory=list)
+  outputs: List[str] = field(default_factory=list)
+  depends_on: List[str] = field(default_factory=list)
+  params: Dict[str, Any] = field(default_factory=dict)
+
+
+class StageCache:
+  """Last successful input fingerprint of every stage, persisted as JSON"""
+
+  def __init__(self, path: str):
+    self.path = path
+    self.fingerprints: Dict[str, str] = {}
+    if os.path.exists(path):
+      with open(path, 'r', encoding='utf-8') as f:
+        self.fingerprints = json.load(f)
+
+  def get(self, name: str) -> Optional[str]:
+    return self.fingerprints.get(name)
+
+  def set(self, name: str, fingerprint: str):
+    self.fingerprints[name] = fingerprint
+
+  def save(self):
+    def write(tmp_path):
+      with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(self.fingerprints, f, indent=2, sort_keys=True)
+
+    storage.replace_atomically(self.path, write)
+
+
+class Pipeline:
+  """
+    Runs stages in dependency order, skipping those whose inputs are
+    unchanged since their last successful run. Stages whose dependencies
+    are all done run concurrently.
+  """
+
+  def __init__(
+    self,
+    stages: List[Stage],
+    cache: StageCache,
+    fingerprints: Optional[FingerprintStore] = None,
+    max_passes: int = 3
+  ):
+    self.stages = {stage.name: stage for stage in stages}
+    self.cache = cache
+    self.fingerprints = fingerprints
+    # A later stage may rewrite a file an earlier stage reads (prepare
+    # rewrites the Q&A / services JSON that documents are chunked from),
+    # so runs repeat until every stage is fresh, up to max_passes
+    self.max_passes = max_passes
+
+    for stage in stages:
+      for dependency in stage.depends_on:
+        if dependency not in self.stages:
+          raise ValueError(f"Stage {stage.name} depends on unknown stage {dependency}")
+
+  def dependencies(self, name: str) -> List[str]:
+    """name and everything it transitively depends on, dependencies first"""
+    ordered = []
+    visiting = set()
+
+    def visit(stage_name):
+      if stage_name in ordered:
+        return
+      if stage_name in visiting:
+        raise ValueError(f"Stage dependency cycle at {stage_name}")
+      visiting.add(stage_name)
+      for dependency in self.stages[stage_name].depends_on:
+        visit(dependency)
+      visiting.discard(stage_name)
+      ordered.append(stage_name)
+
+    visit(name)
+    return ordered
+
+  def fingerprint(self, stage: Stage) -> str:
+    inputs = {
+      "sources": {path: fingerprint_path(path, self.fingerprints) for path in stage.sources},
+      "configs": {path: fingerprint_path(path) for path in stage.configs},
+      "upstream": {
+        path: fingerprint_path(path, self.fingerprints)
+        for dependency in stage.depends_on
+        for path in self.stages[dependency].outputs
+      },
+      "params": stage.params,
+    }
+    encoded = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+  def is_fresh(self, stage: Stage) -> bool:
+    if not all(os.path.exists(path) for path in stage.outputs):
+      return False
+    return self.cache.get(stage.name) == self.fingerprint(stage)
+
+  async def _run_stage(self, stage: Stage) -> bool:
+    """Run a stage, returning False if it reported failures"""
+    print(f"\n[{stage.name}] running...")
+    started = time.perf_counter()
+    try:
+      if inspect.iscoroutinefunction(stage.run):
+        await stage.run()
+      else:
+        await asyncio.to_thread(stage.run)
+    except StageIncomplete as e:
+      print(f"[{stage.name}] incomplete after {time.perf_counter() - started:.2f}s: {e}")
+      return False
+    print(f"[{stage.name}] done in {time.perf_counter() - started:.2f}s")
+    return True
+
+  async def _run_pass(self, names: List[str], force: bool) -> Tuple[List[str], List[str]]:
+    """Run every stale stage once, returning (stages run, stages incomplete)"""
+    done = set()
+    ran = []
+    incomplete = []
+    # Incomplete stages and everything downstream of them: a dependent would
+    # run on partial output (e.g. embed deleting vectors of unchunked files)
+    blocked = set()
+    pending = list(names)
+    while pending:
+      ready = [
+        name for name in pending
+        if all(dependency in done for dependency in self.stages[name].depends_on
+               if dependency in names)
+      ]
+      pending = [name for name in pending if name not in ready]
+
+      stale = []
+      for name in ready:
+        if any(dependency in blocked for dependency in self.stages[name].depends_on):
+          print(f"[{name}] skipped: depends on an incomplete stage")
+          blocked.add(name)
+          incomplete.append(name)
+        elif force or not self.is_fresh(self.stages[name]):
+          stale.append(name)
+        else:
+          print(f"[{name}] up to date, skipping")
+
+      # Fingerprint before running: an input edited while a stage runs must
+      # leave it stale, not be recorded as processed
+      fingerprints = {name: self.fingerprint(self.stages[name]) for name in stale}
+      succeeded = await asyncio.gather(*(self._run_stage(self.stages[name]) for name in stale))
+
+      # Record the inputs a stage actually ran against, unless it reported failures
+      for name, ok in zip(stale, succeeded):
+        if ok:
+          self.cache.set(name, fingerprints[name])
+        else:
+          incomplete.append(name)
+          blocked.add(name)
+      self.cache.save()
+      if self.fingerprints:
+        self.fingerprints.save()
+
+      done.update(ready)
+      ran.extend(stale)
+    return ran, incomplete
+
+  async def run(self, targets: Optional[List[str]] = None, force: bool = False) -> List[str]:
+    """Bring targets (default: every stage) up to date and return the stages that ran"""
+    names = []
+    for target in targets or list(self.stages):
+      for name in self.dependencies(target):
+        if name not in names:
+          names.append(name)
+
+    ran = []
+    for _ in range(self.max_passes):
+      ran_this_pass, incomplete = await self._run_pass(names, force)
+      ran.extend(ran_this_pass)
+      force = False
+      if incomplete:
+        # Failures are retried on the next run, not re-attempted in a loop now
+        print(f"Incomplete stages, retried next run: {', '.join(incomplete)}")
+        break
+      if not ran_this_pass or all(self.is_fresh(self.stages[name]) for name in names):
+        break
+    return ran
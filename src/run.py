@@ -1,5 +1,8 @@
+import time
 import argparse
 import asyncio
+from functools import partial
+from typing import Any, Callable, List
 from datetime import datetime, timezone
 
 from documents.document_chunker import DocumentChunker
@@ -7,9 +10,22 @@ from documents.project_chunker import ProjectChunker
 from documents.document_preparation import DocumentPreparation
 
 from documents.document_utils import DocumentUtils
+from documents.chunk_dataset import ChunkDatasetWriter, is_jsonl
+from documents.parallel_ingest import resolve_workers
 from vectorstore.vector_store import VectorStore
+from vectorstore.index_manifest import IndexManifest
+from pipeline import Pipeline, Stage, StageCache, StageIncomplete
+from documents.directory_scanner import FingerprintStore
 
-from config import INDEX, DOCS_FILE_NAME, PROJECTS_FILE_NAME
+from config import (
+  INDEX,
+  DOCS_FILE_NAME,
+  PROJECTS_FILE_NAME,
+  MANIFEST_DIR,
+  STAGE_CACHE_PATH,
+  FINGERPRINT_DIR,
+  VECTOR_BACKEND,
+)
 
 
 class WorkflowRunner:
@@ -19,6 +35,7 @@ class WorkflowRunner:
                document_chunker: DocumentChunker,
                project_chunker: ProjectChunker,
                vector_store: VectorStore,
+               manifest: IndexManifest = None,
                debug: bool = False
                ):
 
@@ -26,6 +43,7 @@ class WorkflowRunner:
     self.document_chunker = document_chunker
     self.project_chunker = project_chunker
     self.vector_store = vector_store
+    self.manifest = manifest
     self.debug = debug
 
   def prepare_services(self, file_name: str):
@@ -40,34 +58,92 @@ class WorkflowRunner:
     update_questions = self.document_prep.update_questions_with_chunks()
     DocumentUtils.save_to_json(update_questions, file_name)
 
+  def chunk_directory(self, chunker, directory_path: str, file_name: str):
+    """JSONL datasets are streamed to disk document by document; .json is written whole"""
+    if is_jsonl(file_name):
+      with ChunkDatasetWriter(file_name) as writer:
+        return chunker.process_directory(directory_path, writer)
+
+    dataset = chunker.process_directory(directory_path)
+    DocumentUtils.save_to_json(dataset, file_name)
+    return dataset
+
   def chunk_documents(self, directory_path: str, file_name: str, print_summary: bool = True):
     """Chunk all documents"""
-    print("Chunking projects...")
-    dataset = self.document_chunker.process_directory(directory_path)
-    DocumentUtils.save_to_json(dataset, file_name)
+    print("Chunking documents...")
+    dataset = self.chunk_directory(self.document_chunker, directory_path, file_name)
 
     if print_summary:
-      print("\nProcessing Summary:")
-      print(f"Total Documents: {dataset['metadata']['total_documents']}")
-      print(f"Total Chunks: {dataset['metadata']['total_chunks']}")
-      print("\nSubjects found:")
-      for subject in dataset['metadata']['subjects']:
-        print(f"- {subject}")
+      self.print_documents_summary(dataset)
+    return dataset
+
+  def print_documents_summary(self, dataset):
+    print("\nProcessing Summary:")
+    print(f"Total Documents: {dataset['metadata']['total_documents']}")
+    print(f"Total Chunks: {dataset['metadata']['total_chunks']}")
+    print("\nSubjects found:")
+    for subject in dataset['metadata']['subjects']:
+      print(f"- {subject}")
 
   def chunk_projects(self, directory_path: str, file_name: str, print_summary: bool = True):
     """Chunk all projects"""
     print("Chunking projects...")
-    dataset = self.project_chunker.process_directory(directory_path)
-    DocumentUtils.save_to_json(dataset, file_name)
+    dataset = self.chunk_directory(self.project_chunker, directory_path, file_name)
 
     # Print summary
     if print_summary:
-      print("\nProcessing Summary:")
-      print(f"Total Documents: {dataset['metadata']['total_documents']}")
-      print(f"Total Chunks: {dataset['metadata']['total_chunks']}")
-      print("\nClients found:")
-      for client in dataset['metadata']['clients']:
-        print(f"- {client}")
+      self.print_projects_summary(dataset)
+    return dataset
+
+  def print_projects_summary(self, dataset):
+    print("\nProcessing Summary:")
+    print(f"Total Documents: {dataset['metadata']['total_documents']}")
+    print(f"Total Chunks: {dataset['metadata']['total_chunks']}")
+    print("\nClients found:")
+    for client in dataset['metadata']['clients']:
+      print(f"- {client}")
+
+  async def run_concurrently(self, *stages: Callable[[], Any]) -> List[Any]:
+    """
+      Run independent stages at the same time, each in a worker thread, and
+      return their results in stage order once all have finished. Chunking
+      does its CPU work in its own process pool, so threads are enough here.
+    """
+    started = time.perf_counter()
+    results = await asyncio.gather(*(asyncio.to_thread(stage) for stage in stages))
+    print(f"Ran {len(stages)} stages in {time.perf_counter() - started:.2f}s")
+    return results
+
+  @staticmethod
+  def share_workers(chunkers: List[Any]):
+    """
+      Split one CPU budget between chunkers that run at the same time;
+      each starts its own process pool, which would otherwise take every CPU.
+    """
+    if not chunkers:
+      return
+    budget = max(resolve_workers(chunker.workers) for chunker in chunkers)
+    for chunker in chunkers:
+      chunker.workers = max(1, budget // len(chunkers))
+
+  async def chunk_all(self, documents_path: str, documents_file: str, projects_path: str, projects_file: str):
+    """Chunk documents and projects concurrently, then print both summaries"""
+    self.share_workers([self.document_chunker, self.project_chunker])
+    documents, projects = await self.run_concurrently(
+      partial(self.chunk_documents, documents_path, documents_file, print_summary=False),
+      partial(self.chunk_projects, projects_path, projects_file, print_summary=False)
+    )
+    self.print_documents_summary(documents)
+    self.print_projects_summary(projects)
+
+  async def prepare_all(self, questions_file: str, services_file: str):
+    """
+      Questions and services are prepared from the same chunks but write
+      separate files. Both are CPU-bound Python, so threads would only
+      contend for the GIL; they run one after the other.
+    """
+    self.prepare_questions(questions_file)
+    self.prepare_services(services_file)
 
   async def generate_embeddings(self):
     """Embed Upsert all documents"""
@@ -77,7 +153,10 @@ class WorkflowRunner:
     """Embed Upsert all documents"""
     print("Inserting documents into the vector store...")
     chunks = self.document_prep.get_all_chunks()
-    result = await self.vector_store.upsert_documents(chunks, debug=self.debug)
+    if self.debug or self.manifest is None:
+      return await self.vector_store.upsert_documents(chunks, debug=self.debug)
+    # Only embed new / changed chunks, patch metadata and delete removed ids
+    return await self.vector_store.sync_documents(chunks, self.manifest)
 
   def debug(self):
     print("Debugging workflow...")
@@ -91,7 +170,9 @@ class WorkflowRunner:
 async def main():
   parser = argparse.ArgumentParser(description="Run different workflows")
   parser.add_argument("workflow", choices=[
-                      "prepare", "chunk", "embed", "debug"], help="Select a workflow to run")
+                      "prepare", "chunk", "embed", "all", "debug"], help="Select a workflow to run")
+  parser.add_argument("--force", action="store_true",
+                      help="With all: run every stage even if its inputs are unchanged")
 
   timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
 
@@ -118,12 +199,15 @@ async def main():
 
   # Classes
 
-  document_prep = DocumentPreparation(
-    questions_file=questions_file,
-    services_file=services_file,
-    documents_file=documents_file,
-    projects_file=projects_file
-  )
+  def load_document_prep():
+    # Reads the chunked datasets, so it is (re)built after chunking has run
+    return DocumentPreparation(
+      questions_file=questions_file,
+      services_file=services_file,
+      documents_file=documents_file,
+      projects_file=projects_file
+    )
+
   project_chunker = ProjectChunker(
     project_config_file=project_config_file,
     client_config_file=client_config_file
@@ -138,27 +222,96 @@ async def main():
   vector_store = VectorStore(INDEX, debug_output_file=debug_output_file)
 
   runner = WorkflowRunner(
-      document_prep=document_prep,
+      document_prep=None,
       document_chunker=document_chunker,
       project_chunker=project_chunker,
       vector_store=vector_store,
+      manifest=IndexManifest(f"{MANIFEST_DIR}/{vector_store.manifest_key()}.json"),
       debug=False
   )
 
   if args.workflow == "chunk":
     # Chunk all documents from the projects  / documents files
-    runner.chunk_documents(documents_path, documents_file)
-    runner.chunk_projects(projects_path, projects_file)
+    await runner.chunk_all(documents_path, documents_file, projects_path, projects_file)
 
   elif args.workflow == "prepare":
     # Find and add relationship ids to questions and services
-    runner.prepare_questions(questions_file)
-    runner.prepare_services(services_file)
+    runner.document_prep = load_document_prep()
+    await runner.prepare_all(questions_file, services_file)
 
   elif args.workflow == "embed":
+    runner.document_prep = load_document_prep()
     embeddings = await runner.generate_embeddings()
     results = await runner.upsert_documents()
     print(results)
+  elif args.workflow == "all":
+    # chunk -> prepare -> embed, skipping every stage whose inputs are unchanged
+    def chunk_stage(chunk, chunker, directory_path, file_name):
+      def run():
+        chunk(directory_path, file_name)
+        if chunker.failed_files:
+          raise StageIncomplete(f"{len(chunker.failed_files)} files failed to chunk")
+      return run
+
+    async def prepare():
+      runner.document_prep = load_document_prep()
+      await runner.prepare_all(questions_file, services_file)
+
+    async def embed():
+      runner.document_prep = load_document_prep()
+      result = await runner.upsert_documents()
+      print(result)
+      # ManifestDiff from a sync, UpsertResult from a full upsert
+      failed = getattr(result, "failed", None) or getattr(result, "failed_ids", None)
+      if failed:
+        raise StageIncomplete(f"{len(failed)} vectors failed to sync")
+
+    pipeline = Pipeline([
+      Stage(
+        name="chunk_documents",
+        run=chunk_stage(runner.chunk_documents, document_chunker, documents_path, documents_file),
+        sources=[documents_path],
+        configs=[document_config_file],
+        outputs=[documents_file],
+        params={
+          "chunk_size": document_chunker.chunk_size,
+          "chunk_overlap": document_chunker.chunk_overlap
+        }
+      ),
+      Stage(
+        name="chunk_projects",
+        run=chunk_stage(runner.chunk_projects, project_chunker, projects_path, projects_file),
+        sources=[projects_path],
+        configs=[project_config_file, client_config_file],
+        outputs=[projects_file],
+        params={
+          "chunk_size": project_chunker.chunk_size,
+          "chunk_overlap": project_chunker.chunk_overlap
+        }
+      ),
+      Stage(
+        name="prepare",
+        run=prepare,
+        outputs=[questions_file, services_file],
+        depends_on=["chunk_documents", "chunk_projects"]
+      ),
+      Stage(
+        name="embed",
+        run=embed,
+        depends_on=["chunk_documents", "chunk_projects", "prepare"],
+        params={"index": INDEX, "backend": VECTOR_BACKEND}
+      ),
+    ], StageCache(STAGE_CACHE_PATH), FingerprintStore(f"{FINGERPRINT_DIR}/stages.json"))
+
+    # Chunk stages that are stale run in the same wave, in parallel
+    runner.share_workers([
+      chunker for name, chunker in (
+        ("chunk_documents", document_chunker), ("chunk_projects", project_chunker))
+      if args.force or not pipeline.is_fresh(pipeline.stages[name])
+    ])
+    ran = await pipeline.run(force=args.force)
+    print(f"\nStages run: {', '.join(ran) if ran else 'none, everything is up to date'}")
+
   elif args.workflow == "debug":
     runner.debug()
   elif args.workflow == "evaluate":
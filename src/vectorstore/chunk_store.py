@@ -0,0 +1,130 @@
+import os
+import json
+import zlib
+import sqlite3
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Set, Tuple
+
+
+# Bulky per-chunk metadata kept out of the vector index; everything else
+# (priority, source, services, subjects, ...) stays filterable in the index
+TEXT_FIELD = "text"
+MEDIA_FIELDS = [
+  "media_urls",
+  "media_types",
+  "media_texts",
+  "media_ids",
+  "reference_urls",
+  "reference_descriptions",
+]
+
+
+def split_metadata(metadata: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str], Dict[str, Any]]:
+  """Split flat index metadata into (index fields, text, media fields)"""
+  index_metadata = {
+    key: value for key, value in metadata.items()
+    if key != TEXT_FIELD and key not in MEDIA_FIELDS
+  }
+  media = {key: metadata[key] for key in MEDIA_FIELDS if key in metadata}
+  return index_metadata, metadata.get(TEXT_FIELD), media
+
+
+class ChunkStore:
+  """
+    Local side store of chunk text and media keyed by chunk_id, so vectors
+    in the index only carry ids and filterable fields. Text and media are
+    separate columns: reranking needs every candidate's text, but media are
+    only fetched for the final results.
+
+    Readers pass create=False: a missing or empty store raises instead of
+    being created empty, which would silently drop every hit's media.
+  """
+
+  def __init__(self, path: str, create: bool = True):
+    self.path = path
+    if not create:
+      self._check_exists()
+      return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with self._connect() as conn:
+      conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunks (
+          chunk_id TEXT PRIMARY KEY,
+          text TEXT,
+          media BLOB
+        )""")
+
+  def _check_exists(self):
+    missing = FileNotFoundError(
+      f"No chunk store found at {self.path}. Run the embed step with "
+      f"CHUNK_STORE_PATH set and deploy the store with the app.")
+    if not os.path.exists(self.path):
+      raise missing
+    with self._connect() as conn:
+      try:
+        row = conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone()
+      except sqlite3.OperationalError:
+        row = None
+    if row is None:
+      raise missing
+
+  @contextmanager
+  def _connect(self) -> Iterator[sqlite3.Connection]:
+    conn = sqlite3.connect(self.path, timeout=30)
+    try:
+      conn.execute("PRAGMA journal_mode=WAL")
+      with conn:
+        yield conn
+    finally:
+      conn.close()
+
+  def put_many(self, chunks: Iterable[Tuple[str, Optional[str], Dict[str, Any]]]):
+    """Insert or replace (chunk_id, text, media) rows in one transaction"""
+    with self._connect() as conn:
+      conn.executemany(
+        "INSERT OR REPLACE INTO chunks (chunk_id, text, media) VALUES (?, ?, ?)",
+        (
+          (chunk_id, text, zlib.compress(json.dumps(media, ensure_ascii=False).encode('utf-8')))
+          for chunk_id, text, media in chunks
+        )
+      )
+
+  def delete_many(self, chunk_ids: Sequence[str]):
+    with self._connect() as conn:
+      conn.executemany(
+        "DELETE FROM chunks WHERE chunk_id = ?", ((chunk_id,) for chunk_id in chunk_ids))
+
+  def _select(self, columns: str, chunk_ids: Sequence[str]) -> List[tuple]:
+    rows = []
+    unique = list(dict.fromkeys(chunk_ids))
+    batch_size = 500  # stay under sqlite's bound-parameter limit
+    with self._connect() as conn:
+      for i in range(0, len(unique), batch_size):
+        batch = unique[i: i + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        rows.extend(conn.execute(
+          f"SELECT chunk_id, {columns} FROM chunks WHERE chunk_id IN ({placeholders})",
+          batch
+        ))
+    return rows
+
+  def existing(self, chunk_ids: Sequence[str]) -> Set[str]:
+    """The subset of chunk_ids that are stored"""
+    return {chunk_id for chunk_id, _ in self._select("1", chunk_ids)}
+
+  def get_texts(self, chunk_ids: Sequence[str]) -> Dict[str, str]:
+    """chunk_id -> text for the ids that are stored"""
+    return {
+      chunk_id: text
+      for chunk_id, text in self._select("text", chunk_ids)
+      if text is not None
+    }
+
+  def get_media(self, chunk_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """chunk_id -> media fields for the ids that are stored"""
+    return {
+      chunk_id: json.loads(zlib.decompress(media).decode('utf-8'))
+      for chunk_id, media in self._select("media", chunk_ids)
+      if media
+    }
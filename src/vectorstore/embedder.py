@@ -0,0 +1,168 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import List, Callable, Optional
+
+import voyageai
+from voyageai.error import RateLimitError, ServiceUnavailableError, Timeout, APIConnectionError
+
+from config import (
+  EMBED_CONCURRENCY,
+  EMBED_TOKENS_PER_MINUTE,
+  EMBED_REQUESTS_PER_MINUTE,
+  EMBED_MAX_BATCH_TOKENS,
+)
+
+RETRYABLE_ERRORS = (RateLimitError, ServiceUnavailableError, Timeout, APIConnectionError)
+
+
+def estimate_tokens(text: str) -> int:
+  """Cheap upper-bound token estimate (~3 characters per token)"""
+  return len(text) // 3 + 1
+
+
+class TokenBucket:
+  """Continuous-refill token bucket shared by concurrent requests"""
+
+  def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+    self.rate = rate_per_minute / 60.0
+    self.capacity = capacity or rate_per_minute
+    self.tokens = self.capacity
+    self.updated = time.monotonic()
+    self._lock = asyncio.Lock()
+
+  def _refill(self):
+    now = time.monotonic()
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+
+  async def acquire(self, amount: float = 1):
+    amount = min(amount, self.capacity)
+    async with self._lock:
+      while True:
+        self._refill()
+        if self.tokens >= amount:
+          self.tokens -= amount
+          return
+        await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AsyncEmbedder:
+  """
+    Concurrent Voyage embedder.
+
+    Texts are packed into batches by estimated token count (and the API's
+    per-request item limit), several batches run concurrently, and every
+    request first takes from a tokens-per-minute and a requests-per-minute
+    bucket. Rate-limit and transient errors are retried with exponential
+    backoff and full jitter.
+  """
+
+  def __init__(
+    self,
+    api_key: str = os.getenv("VOYAGE_API_KEY"),
+    model: str = "voyage-2",
+    input_type: Optional[str] = None,
+    concurrency: int = EMBED_CONCURRENCY,
+    tokens_per_minute: int = EMBED_TOKENS_PER_MINUTE,
+    requests_per_minute: int = EMBED_REQUESTS_PER_MINUTE,
+    max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS,
+    max_batch_size: int = 128,
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    token_counter: Callable[[str], int] = estimate_tokens,
+  ):
+    # Retries are handled here so they share the rate limiters
+    self.client = voyageai.AsyncClient(api_key=api_key, max_retries=0)
+    self.model = model
+    self.input_type = input_type
+    self.concurrency = concurrency
+    self.tokens_per_minute = tokens_per_minute
+    self.requests_per_minute = requests_per_minute
+    self.max_batch_tokens = max_batch_tokens
+    self.max_batch_size = max_batch_size
+    self.max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.token_counter = token_counter
+    self._limits = None
+    self._limits_loop = None
+
+  def pack_batches(self, texts: List[str]) -> List[List[int]]:
+    """Greedily group text indices so each batch stays under the token and item limits"""
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+      tokens = self.token_counter(text)
+      if current and (current_tokens + tokens > self.max_batch_tokens
+                      or len(current) >= self.max_batch_size):
+        batches.append(current)
+        current = []
+        current_tokens = 0
+      current.append(i)
+      current_tokens += tokens
+    if current:
+      batches.append(current)
+    return batches
+
+  async def _embed_batch(self, texts: List[str], tokens: int, limits) -> List[List[float]]:
+    semaphore, token_bucket, request_bucket = limits
+    attempt = 0
+    while True:
+      async with semaphore:
+        await request_bucket.acquire(1)
+        await token_bucket.acquire(tokens)
+        try:
+          response = await self.client.embed(
+            texts, model=self.model, input_type=self.input_type)
+          return response.embeddings
+        except RETRYABLE_ERRORS as e:
+          if attempt >= self.max_retries:
+            raise
+          error = e
+
+      # Back off outside the semaphore so other batches keep flowing
+      delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+      attempt += 1
+      logging.warning(
+        f"Embedding batch of {len(texts)} failed ({type(error).__name__}), "
+        f"retry {attempt}/{self.max_retries} in {delay:.1f}s")
+      await asyncio.sleep(delay)
+
+  def _get_limits(self):
+    """Limiters are shared across calls but must belong to the running event loop"""
+    loop = asyncio.get_running_loop()
+    if self._limits is None or self._limits_loop is not loop:
+      self._limits = (
+        asyncio.Semaphore(self.concurrency),
+        TokenBucket(self.tokens_per_minute),
+        TokenBucket(self.requests_per_minute),
+      )
+      self._limits_loop = loop
+    return self._limits
+
+  async def embed(self, texts: List[str]) -> List[List[float]]:
+    """Embed texts, returning vectors in input order"""
+    if not texts:
+      return []
+
+    limits = self._get_limits()
+    batches = self.pack_batches(texts)
+    results = await asyncio.gather(*(
+      self._embed_batch(
+        [texts[i] for i in batch],
+        sum(self.token_counter(texts[i]) for i in batch),
+        limits
+      )
+      for batch in batches
+    ))
+
+    embeddings: List[Optional[List[float]]] = [None] * len(texts)
+    for batch, batch_embeddings in zip(batches, results):
+      for i, embedding in zip(batch, batch_embeddings):
+        embeddings[i] = embedding
+    return embeddings
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterator, Sequence
+
+import numpy as np
+
+
+class EmbeddingCache:
+  """
+    Persistent, content-addressed store of document embeddings.
+
+    Entries are keyed by (model, sha256 of the embedded text), so a chunk
+    whose prepared text is unchanged between runs is never re-embedded,
+    whatever its chunk id or position.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with self._connect() as conn:
+      conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+          model TEXT NOT NULL,
+          text_hash TEXT NOT NULL,
+          embedding BLOB NOT NULL,
+          PRIMARY KEY (model, text_hash)
+        )""")
+
+  @contextmanager
+  def _connect(self) -> Iterator[sqlite3.Connection]:
+    conn = sqlite3.connect(self.path, timeout=30)
+    try:
+      conn.execute("PRAGMA journal_mode=WAL")
+      with conn:
+        yield conn
+    finally:
+      conn.close()
+
+  @staticmethod
+  def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+  def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+    """Return the cached embedding for each text, or None on a miss"""
+    hashes = [self.text_hash(text) for text in texts]
+    found: Dict[str, np.ndarray] = {}
+    unique = list(dict.fromkeys(hashes))
+    batch_size = 500  # stay under sqlite's bound-parameter limit
+    with self._connect() as conn:
+      for i in range(0, len(unique), batch_size):
+        batch = unique[i: i + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        rows = conn.execute(
+          f"SELECT text_hash, embedding FROM embeddings "
+          f"WHERE model = ? AND text_hash IN ({placeholders})",
+          [model, *batch]
+        )
+        for text_hash, blob in rows:
+          found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+    return [found.get(text_hash) for text_hash in hashes]
+
+  def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+    with self._connect() as conn:
+      conn.executemany(
+        "INSERT OR REPLACE INTO embeddings (model, text_hash, embedding) VALUES (?, ?, ?)",
+        [
+          (model, self.text_hash(text),
+           np.asarray(embedding, dtype=np.float32).tobytes())
+          for text, embedding in zip(texts, embeddings)
+        ]
+      )
+
+  def _merge(self, model, texts, embeddings, missing, fresh) -> List[np.ndarray]:
+    self.put_many(model, missing, fresh)
+    by_text = {
+      text: np.asarray(embedding, dtype=np.float32)
+      for text, embedding in zip(missing, fresh)
+    }
+    return [
+      embedding if embedding is not None else by_text[text]
+      for text, embedding in zip(texts, embeddings)
+    ]
+
+  def _lookup(self, model: str, texts: Sequence[str]):
+    embeddings = self.get_many(model, texts)
+    missing = list(dict.fromkeys(
+      text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if missing:
+      print(f"Embedding {len(missing)} of {len(texts)} texts ({len(texts) - len(missing)} cached)")
+    return embeddings, missing
+
+  def embed(self, model: str, texts: Sequence[str], embed_fn) -> List[np.ndarray]:
+    """
+      Return embeddings for texts, calling embed_fn(missing_texts) only for
+      cache misses and storing what it returns.
+    """
+    embeddings, missing = self._lookup(model, texts)
+    if not missing:
+      return embeddings
+    return self._merge(model, texts, embeddings, missing, embed_fn(missing))
+
+  async def aembed(self, model: str, texts: Sequence[str], embed_fn) -> List[np.ndarray]:
+    """Async variant of embed for a coroutine embed_fn"""
+    embeddings, missing = self._lookup(model, texts)
+    if not missing:
+      return embeddings
+    return self._merge(model, texts, embeddings, missing, await embed_fn(missing))
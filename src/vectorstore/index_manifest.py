@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+from typing import List, Dict, Tuple, Iterable
+from dataclasses import dataclass, field
+
+from vectorstore import storage
+
+
+@dataclass
+class ManifestDiff:
+  added: List[str] = field(default_factory=list)
+  changed: List[str] = field(default_factory=list)  # text changed, needs re-embedding
+  metadata_only: List[str] = field(default_factory=list)
+  removed: List[str] = field(default_factory=list)
+  unchanged: int = 0
+  failed: List[str] = field(default_factory=list)  # set by sync, retried next run
+
+  def summary(self) -> str:
+    summary = (f"{len(self.added)} new, {len(self.changed)} changed, "
+               f"{len(self.metadata_only)} metadata-only, {len(self.removed)} removed, "
+               f"{self.unchanged} unchanged")
+    if self.failed:
+      summary += f", {len(self.failed)} failed"
+    return summary
+
+
+class IndexManifest:
+  """
+    Record of what an index currently holds: chunk_id -> (content hash,
+    metadata hash). Diffing the next set of chunks against it tells the
+    embed workflow what to embed, what to patch and what to delete.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self.entries: Dict[str, Tuple[str, str]] = {}
+
+    if os.path.exists(path):
+      with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+      self.entries = {
+        chunk_id: (entry["content_hash"], entry["metadata_hash"])
+        for chunk_id, entry in data.get("chunks", {}).items()
+      }
+
+  @staticmethod
+  def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+  @staticmethod
+  def hash_metadata(metadata: Dict) -> str:
+    encoded = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+  def diff(self, current: Dict[str, Tuple[str, str]]) -> ManifestDiff:
+    diff = ManifestDiff()
+    for chunk_id, (content_hash, metadata_hash) in current.items():
+      previous = self.entries.get(chunk_id)
+      if previous is None:
+        diff.added.append(chunk_id)
+      elif previous[0] != content_hash:
+        diff.changed.append(chunk_id)
+      elif previous[1] != metadata_hash:
+        diff.metadata_only.append(chunk_id)
+      else:
+        diff.unchanged += 1
+
+    diff.removed = [
+      chunk_id for chunk_id in self.entries if chunk_id not in current]
+    return diff
+
+  def clear(self):
+    """Forget every entry, so the next diff treats all chunks as new"""
+    self.entries.clear()
+
+  def update(self, synced: Dict[str, Tuple[str, str]], removed: Iterable[str] = ()):
+    """Record chunks that were written to the index and ids that were deleted"""
+    self.entries.update(synced)
+    for chunk_id in removed:
+      self.entries.pop(chunk_id, None)
+
+  def save(self):
+    data = {
+      "chunks": {
+        chunk_id: {"content_hash": content_hash, "metadata_hash": metadata_hash}
+        for chunk_id, (content_hash, metadata_hash) in self.entries.items()
+      }
+    }
+
+    def write(tmp_path):
+      with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+    storage.replace_atomically(self.path, write)
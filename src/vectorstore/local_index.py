@@ -0,0 +1,273 @@
+import os
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from vectorstore.metadata_filter import ColumnarMetadata
+from vectorstore import storage
+
+
+@dataclass
+class LocalMatch:
+  id: str
+  score: float
+  metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class LocalQueryResponse:
+  matches: List[LocalMatch] = field(default_factory=list)
+  namespace: str = ""
+
+
+class LocalIndex:
+  """
+    In-process vector index exposing the subset of the Pinecone Index
+    surface used by VectorStore (upsert / query / update / delete).
+
+    Vectors are kept as one contiguous, L2-normalised float32 matrix so a
+    cosine query is a single matrix-vector product. Metadata is stored
+    columnar (field -> list of values, None where a row has no value).
+  """
+
+  VECTORS_FILE = "vectors.npy"
+  METADATA_FILE = "metadata.jsonl"
+
+  def __init__(self, dimension: int = 1024, path: Optional[str] = None, create: bool = True):
+    self.dimension = dimension
+    self.path = path
+
+    self._vectors = np.zeros((0, dimension), dtype=np.float32)
+    self._size = 0
+    self._ids: List[str] = []
+    self._positions: Dict[str, int] = {}
+    self._columns: Dict[str, List[Any]] = {}
+    self._columnar: Optional[ColumnarMetadata] = None
+
+    if path and storage.read_header(path) is not None:
+      self.load()
+
+    # Readers (the chat app) must not silently start on an empty index
+    if not create and self._size == 0:
+      raise FileNotFoundError(
+        f"No local index found at {path}. Run the embed step to build it first.")
+
+  def __len__(self):
+    return self._size
+
+  @property
+  def vectors(self) -> np.ndarray:
+    return self._vectors[:self._size]
+
+  @staticmethod
+  def _normalise(values: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(values, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return values / norms
+
+  def _reserve(self, capacity: int):
+    """Grow the backing matrix geometrically so segment upserts stay amortised O(n)."""
+    if capacity <= self._vectors.shape[0]:
+      return
+    new_capacity = max(capacity, 2 * self._vectors.shape[0], 64)
+    grown = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+    grown[:self._size] = self._vectors[:self._size]
+    self._vectors = grown
+
+  def _set_metadata(self, position: int, metadata: Dict[str, Any]):
+    for key in metadata.keys() - self._columns.keys():
+      self._columns[key] = [None] * self._size
+    for key, column in self._columns.items():
+      column[position] = metadata.get(key)
+
+  def _row_metadata(self, position: int) -> Dict[str, Any]:
+    return {
+      key: column[position]
+      for key, column in self._columns.items()
+      if column[position] is not None
+    }
+
+  def upsert(self, vectors: List[Dict[str, Any]], **kwargs) -> Dict[str, int]:
+    """Insert or replace vectors given as Pinecone-style {'id', 'values', 'metadata'} dicts"""
+    if not vectors:
+      return {"upserted_count": 0}
+
+    values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+    if values.shape[1] != self.dimension:
+      raise ValueError(
+        f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}")
+    values = self._normalise(values)
+    self._columnar = None
+
+    new_ids = [
+      vector["id"] for vector in vectors
+      if vector["id"] not in self._positions
+    ]
+    self._reserve(self._size + len(new_ids))
+
+    for vector, row in zip(vectors, values):
+      vector_id = vector["id"]
+      position = self._positions.get(vector_id)
+      if position is None:
+        position = self._size
+        self._positions[vector_id] = position
+        self._ids.append(vector_id)
+        for column in self._columns.values():
+          column.append(None)
+        self._size += 1
+
+      self._vectors[position] = row
+      self._set_metadata(position, vector.get("metadata") or {})
+
+    return {"upserted_count": len(vectors)}
+
+  def update(
+    self,
+    id: str,
+    values: Optional[List[float]] = None,
+    set_metadata: Optional[Dict[str, Any]] = None,
+    **kwargs
+  ):
+    """Patch one vector in place; set_metadata merges into existing metadata like Pinecone"""
+    position = self._positions.get(id)
+    if position is None:
+      return {}
+
+    if values is not None:
+      self._vectors[position] = self._normalise(
+        np.asarray(values, dtype=np.float32))
+    if set_metadata:
+      merged = self._row_metadata(position)
+      merged.update(set_metadata)
+      self._set_metadata(position, merged)
+      self._columnar = None
+    return {}
+
+  def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, **kwargs):
+    """Remove vectors and compact the matrix so it stays contiguous"""
+    if delete_all:
+      ids = list(self._ids)
+    doomed = {self._positions[i] for i in (ids or []) if i in self._positions}
+    if not doomed:
+      return {}
+
+    keep = np.array(
+      [position not in doomed for position in range(self._size)], dtype=bool)
+    self._vectors = np.ascontiguousarray(self.vectors[keep])
+    self._ids = [vector_id for vector_id, kept in zip(self._ids, keep) if kept]
+    self._positions = {vector_id: i for i, vector_id in enumerate(self._ids)}
+    self._columns = {
+      key: [value for value, kept in zip(column, keep) if kept]
+      for key, column in self._columns.items()
+    }
+    self._size = len(self._ids)
+    self._columnar = None
+    return {}
+
+  @property
+  def columns(self) -> ColumnarMetadata:
+    """Filterable column view, rebuilt lazily after writes"""
+    if self._columnar is None:
+      self._columnar = ColumnarMetadata(self._columns, self._size)
+    return self._columnar
+
+  def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    if not filter:
+      return None
+    return self.columns.mask(filter)
+
+  def query(
+    self,
+    vector: List[float],
+    top_k: int = 10,
+    include_metadata: bool = False,
+    filter: Optional[Dict[str, Any]] = None,
+    **kwargs
+  ) -> LocalQueryResponse:
+    """Return the top_k cosine matches for a single query vector"""
+    if self._size == 0:
+      return LocalQueryResponse()
+
+    query = self._normalise(np.asarray(vector, dtype=np.float32))
+    scores = self.vectors @ query
+
+    mask = self._filter_mask(filter)
+    if mask is not None:
+      scores = np.where(mask, scores, -np.inf)
+      available = int(mask.sum())
+    else:
+      available = self._size
+
+    k = min(top_k, available)
+    if k <= 0:
+      return LocalQueryResponse()
+
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+
+    return LocalQueryResponse(matches=[
+      LocalMatch(
+        id=self._ids[i],
+        score=float(scores[i]),
+        metadata=self._row_metadata(i) if include_metadata else {}
+      )
+      for i in top
+    ])
+
+  def save(self, path: Optional[str] = None):
+    """
+      Persist the index as a raw vector matrix plus a JSONL metadata sidecar.
+
+      Each save writes a fresh version directory; the header, swapped in
+      atomically last, is the only pointer to it. A reader therefore sees
+      either the old or the new version, never vectors of one with the
+      metadata of the other.
+    """
+    path = path or self.path
+    if not path:
+      raise ValueError("No path given to save the local index to.")
+
+    version, version_path = storage.new_version(path)
+    storage.save_matrix(os.path.join(version_path, self.VECTORS_FILE), self.vectors)
+    storage.write_jsonl(
+      os.path.join(version_path, self.METADATA_FILE),
+      ({"id": vector_id, "metadata": self._row_metadata(i)}
+       for i, vector_id in enumerate(self._ids))
+    )
+    storage.publish_version(
+      path, version, {"dimension": self.dimension, "count": self._size})
+
+  def _load_version(self, path: str, header: Dict[str, Any]):
+    version_path = storage.version_path(path, header)
+    count = header["count"]
+
+    # Copy-on-write mapping: pages stay shared until an upsert touches them
+    vectors = storage.load_matrix(
+      os.path.join(version_path, self.VECTORS_FILE), mmap_mode="c")
+    records = storage.read_jsonl(os.path.join(version_path, self.METADATA_FILE))
+    if vectors.shape[0] != count or len(records) != count:
+      raise ValueError(
+        f"Local index at {path} is inconsistent: header has {count} rows, "
+        f"vectors {vectors.shape[0]}, metadata {len(records)}")
+
+    self.dimension = header["dimension"]
+    self._vectors = vectors
+    self._size = count
+    self._ids = []
+    self._positions = {}
+    self._columns = {}
+    self._columnar = None
+
+    for position, record in enumerate(records):
+      self._ids.append(record["id"])
+      self._positions[record["id"]] = position
+      for key in record["metadata"].keys() - self._columns.keys():
+        self._columns[key] = [None] * self._size
+      for key, value in record["metadata"].items():
+        self._columns[key][position] = value
+
+  def load(self, path: Optional[str] = None, attempts: int = 3):
+    path = path or self.path
+    if not storage.load_version(path, lambda header: self._load_version(path, header), attempts):
+      raise ValueError(f"No local index found at {path}")
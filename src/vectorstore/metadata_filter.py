@@ -0,0 +1,189 @@
+from typing import List, Dict, Any, Callable, Optional
+
+import numpy as np
+
+
+FilterMask = Callable[["ColumnarMetadata"], np.ndarray]
+
+RANGE_OPERATORS = {
+  "$gt": np.greater,
+  "$gte": np.greater_equal,
+  "$lt": np.less,
+  "$lte": np.less_equal,
+}
+
+
+def _is_number(value: Any) -> bool:
+  return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ColumnarMetadata:
+  """
+    Column-oriented view of per-vector metadata for vectorised filtering.
+
+    A field is indexed the first time a filter uses it, so bulky fields
+    nobody filters on (text, ids, media urls) are never indexed. Numeric
+    fields become float64 arrays (NaN where missing). Every other field
+    (strings, bools and lists of strings such as subjects, services and
+    categories) gets an inverted index: value -> sorted row positions.
+  """
+
+  def __init__(self, columns: Dict[str, List[Any]], size: int):
+    self.size = size
+    self.columns = columns
+    self.numeric: Dict[str, np.ndarray] = {}
+    self.postings: Dict[str, Dict[Any, np.ndarray]] = {}
+
+  @classmethod
+  def from_rows(cls, rows: List[Dict[str, Any]]) -> "ColumnarMetadata":
+    columns: Dict[str, List[Any]] = {}
+    for position, row in enumerate(rows):
+      for key, value in row.items():
+        if key not in columns:
+          columns[key] = [None] * len(rows)
+        columns[key][position] = value
+    return cls(columns, len(rows))
+
+  def _index(self, field: str):
+    if field in self.numeric or field in self.postings:
+      return
+    column = self.columns.get(field, [])
+    present = [value for value in column if value is not None]
+    if present and all(_is_number(value) for value in present):
+      self.numeric[field] = np.array(
+        [np.nan if value is None else value for value in column],
+        dtype=np.float64
+      )
+    else:
+      self.postings[field] = self._build_postings(column)
+
+  @staticmethod
+  def _build_postings(column: List[Any]) -> Dict[Any, np.ndarray]:
+    positions: Dict[Any, List[int]] = {}
+    for position, value in enumerate(column):
+      if value is None:
+        continue
+      for item in (value if isinstance(value, list) else [value]):
+        try:
+          rows = positions.setdefault(item, [])
+        except TypeError:  # unhashable values can't be filtered on
+          continue
+        if not rows or rows[-1] != position:  # repeated list items
+          rows.append(position)
+    return {item: np.array(rows, dtype=np.intp) for item, rows in positions.items()}
+
+  def _numeric(self, field: str) -> Optional[np.ndarray]:
+    self._index(field)
+    return self.numeric.get(field)
+
+  def _positions(self, field: str, value: Any) -> Optional[np.ndarray]:
+    self._index(field)
+    try:
+      return self.postings.get(field, {}).get(value)
+    except TypeError:
+      return None
+
+  def none(self) -> np.ndarray:
+    return np.zeros(self.size, dtype=bool)
+
+  def all(self) -> np.ndarray:
+    return np.ones(self.size, dtype=bool)
+
+  def equals(self, field: str, value: Any) -> np.ndarray:
+    column = self._numeric(field)
+    if column is not None:
+      if not _is_number(value):
+        return self.none()
+      return column == value
+    mask = self.none()
+    positions = self._positions(field, value)
+    if positions is not None:
+      mask[positions] = True
+    return mask
+
+  def one_of(self, field: str, values: List[Any]) -> np.ndarray:
+    column = self._numeric(field)
+    if column is not None:
+      numbers = [value for value in values if _is_number(value)]
+      return np.isin(column, numbers)
+    mask = self.none()
+    for value in values:
+      positions = self._positions(field, value)
+      if positions is not None:
+        mask[positions] = True
+    return mask
+
+  def compare(self, field: str, op: str, value: Any) -> np.ndarray:
+    column = self._numeric(field)
+    if column is None:
+      return self.none()
+    return RANGE_OPERATORS[op](column, value)
+
+  def mask(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+    """Evaluate a Pinecone filter dict to a boolean row mask"""
+    return compile_filter(filter)(self)
+
+
+def _compile_condition(field: str, op: str, operand: Any) -> FilterMask:
+  match op:
+    case "$eq":
+      return lambda columns: columns.equals(field, operand)
+    case "$ne":
+      return lambda columns: ~columns.equals(field, operand)
+    case "$in":
+      return lambda columns: columns.one_of(field, list(operand))
+    case "$nin":
+      return lambda columns: ~columns.one_of(field, list(operand))
+    case _ if op in RANGE_OPERATORS:
+      if not _is_number(operand):
+        raise ValueError(f"{op} requires a numeric operand, got {operand!r}")
+      return lambda columns: columns.compare(field, op, operand)
+    case _:
+      raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def _combine(masks: List[FilterMask], reduce) -> FilterMask:
+  def evaluate(columns: ColumnarMetadata) -> np.ndarray:
+    return reduce([mask(columns) for mask in masks])
+  return evaluate
+
+
+def _all_of(results: List[np.ndarray]) -> np.ndarray:
+  return np.logical_and.reduce(results)
+
+
+def _any_of(results: List[np.ndarray]) -> np.ndarray:
+  return np.logical_or.reduce(results)
+
+
+def compile_filter(filter: Optional[Dict[str, Any]]) -> FilterMask:
+  """
+    Compile a Pinecone metadata filter into a function over ColumnarMetadata.
+
+    Supports field equality shorthand ({"subjects": "Branding"}), the
+    $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte operators and $and/$or nesting.
+    List fields match when any of their values match.
+  """
+  if not filter:
+    return lambda columns: columns.all()
+
+  masks: List[FilterMask] = []
+  for key, condition in filter.items():
+    if key in ("$and", "$or"):
+      if not isinstance(condition, list) or not condition:
+        raise ValueError(f"{key} expects a non-empty list of filters")
+      nested = [compile_filter(sub) for sub in condition]
+      masks.append(_combine(nested, _all_of if key == "$and" else _any_of))
+      continue
+
+    if key.startswith("$"):
+      raise ValueError(f"Unsupported filter operator: {key}")
+
+    if not isinstance(condition, dict):
+      condition = {"$eq": condition}
+    for op, operand in condition.items():
+      masks.append(_compile_condition(key, op, operand))
+
+  if len(masks) == 1:
+    return masks[0]
+  return _combine(masks, _all_of)
@@ -0,0 +1,108 @@
+import re
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+  return TOKEN_PATTERN.findall(text.lower())
+
+
+def bm25_scores(query: str, texts: List[str], k1: float = 1.2, b: float = 0.75) -> np.ndarray:
+  """Okapi BM25 of each text against query, with IDF taken over texts themselves"""
+  query_terms = set(tokenize(query))
+  if not texts or not query_terms:
+    return np.zeros(len(texts))
+
+  term_counts = [Counter(tokenize(text)) for text in texts]
+  lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float64)
+  average_length = lengths.mean() or 1.0
+
+  scores = np.zeros(len(texts))
+  for term in query_terms:
+    frequencies = np.array([counts.get(term, 0) for counts in term_counts], dtype=np.float64)
+    document_frequency = np.count_nonzero(frequencies)
+    if not document_frequency:
+      continue
+    idf = np.log(1.0 + (len(texts) - document_frequency + 0.5) / (document_frequency + 0.5))
+    scores += idf * frequencies * (k1 + 1) / (
+      frequencies + k1 * (1 - b + b * lengths / average_length))
+  return scores
+
+
+class PreRanker:
+  """
+    Cheap local first stage for the remote reranker. Candidates are scored
+    on their vector similarity, BM25 against the query (normalised over the
+    candidate set) and stored priority; chunks related to another candidate
+    are boosted. Only the best n go on to the paid rerank call.
+  """
+
+  def __init__(
+    self,
+    vector_weight: float = 1.0,
+    lexical_weight: float = 1.0,
+    priority_weight: float = 0.5,
+    relationship_boost: float = 1.5
+  ):
+    self.vector_weight = vector_weight
+    self.lexical_weight = lexical_weight
+    self.priority_weight = priority_weight
+    self.relationship_boost = relationship_boost
+
+  def scores(
+    self,
+    query: str,
+    ids: List[str],
+    texts: List[str],
+    vector_scores: List[float],
+    metadatas: List[Dict[str, Any]]
+  ) -> np.ndarray:
+    lexical = bm25_scores(query, texts)
+    if lexical.max(initial=0.0) > 0:
+      lexical = lexical / lexical.max()
+
+    priorities = np.array(
+      [metadata.get('priority', 0.5) for metadata in metadatas], dtype=np.float64)
+
+    combined = (
+      self.vector_weight * np.asarray(vector_scores, dtype=np.float64) +
+      self.lexical_weight * lexical +
+      self.priority_weight * priorities
+    )
+
+    # Linked in either direction to another candidate
+    candidates = set(ids)
+    linked = set()
+    for id, metadata in zip(ids, metadatas):
+      related = candidates.intersection(metadata.get('related_chunks') or [])
+      related.discard(id)
+      if related:
+        linked.add(id)
+        linked.update(related)
+    boost = np.array(
+      [self.relationship_boost if id in linked else 1.0 for id in ids], dtype=np.float64)
+
+    return combined * boost
+
+  def select(
+    self,
+    query: str,
+    ids: List[str],
+    texts: List[str],
+    vector_scores: List[float],
+    metadatas: List[Dict[str, Any]],
+    n: Optional[int]
+  ) -> List[int]:
+    """Indices of the n best candidates, best first; all of them when n is None or >= len(ids)"""
+    if n is None or n >= len(ids):
+      return list(range(len(ids)))
+
+    n = max(n, 1)
+    scores = self.scores(query, ids, texts, vector_scores, metadatas)
+    top = np.argpartition(-scores, n - 1)[:n]
+    return [int(i) for i in top[np.argsort(-scores[top], kind='stable')]]
@@ -0,0 +1,197 @@
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import weakref
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+
+import numpy as np
+
+
+# One background writer and one exit hook shared by every cache. Both hold
+# caches weakly, so neither keeps a discarded cache alive.
+_live_caches: "weakref.WeakSet[QueryCache]" = weakref.WeakSet()
+_flush_queue: "queue.Queue[weakref.ref]" = queue.Queue()
+_flush_thread: Optional[threading.Thread] = None
+_flush_thread_lock = threading.Lock()
+
+
+def _flush_worker():
+  while True:
+    cache = _flush_queue.get()()
+    if cache is not None:
+      try:
+        cache.flush()
+      except sqlite3.Error as e:
+        print(f"Query cache flush failed: {e}")
+    del cache
+
+
+def _schedule_flush(cache: "QueryCache"):
+  global _flush_thread
+  with _flush_thread_lock:
+    if _flush_thread is None:
+      _flush_thread = threading.Thread(target=_flush_worker, name="query-cache-flush", daemon=True)
+      _flush_thread.start()
+  _flush_queue.put(weakref.ref(cache))
+
+
+@atexit.register
+def _flush_all():
+  for cache in list(_live_caches):
+    cache.close()
+
+
+class QueryCache:
+  """
+    Bounded cache of query embeddings.
+
+    Lookups are served from an in-memory LRU capped at max_entries, with an
+    optional TTL. New entries are written behind to a small sqlite file:
+    they are buffered, and once flush_every puts or flush_interval seconds
+    have accumulated a shared background thread writes them. close() and
+    interpreter exit flush synchronously. A search never pays for the
+    sqlite commit.
+  """
+
+  def __init__(
+    self,
+    path: str,
+    max_entries: int = 5000,
+    ttl: Optional[float] = None,
+    flush_every: int = 32,
+    flush_interval: float = 30.0,
+  ):
+    self.path = path
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.flush_every = flush_every
+    self.flush_interval = flush_interval
+
+    self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, float]]" = OrderedDict()
+    self._pending: Dict[Tuple[str, str], Tuple[np.ndarray, float]] = {}
+    self._last_flush = time.monotonic()
+    self._flush_scheduled = False
+    self._lock = threading.Lock()
+    # Serialises writers so an older batch never lands after a newer one
+    self._flush_lock = threading.Lock()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with self._connect() as conn:
+      conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_cache (
+          model TEXT NOT NULL,
+          query TEXT NOT NULL,
+          embedding BLOB NOT NULL,
+          created_at REAL NOT NULL,
+          PRIMARY KEY (model, query)
+        )""")
+    self._load()
+    _live_caches.add(self)
+
+  @contextmanager
+  def _connect(self) -> Iterator[sqlite3.Connection]:
+    conn = sqlite3.connect(self.path, timeout=10)
+    try:
+      conn.execute("PRAGMA journal_mode=WAL")
+      with conn:
+        yield conn
+    finally:
+      conn.close()
+
+  def _expired(self, created_at: float) -> bool:
+    return self.ttl is not None and time.time() - created_at > self.ttl
+
+  def _load(self):
+    """Warm the LRU with the most recent entries on disk"""
+    with self._connect() as conn:
+      rows = conn.execute(
+        "SELECT model, query, embedding, created_at FROM query_cache "
+        "ORDER BY created_at DESC LIMIT ?", (self.max_entries,)
+      ).fetchall()
+    for model, query, blob, created_at in reversed(rows):
+      if not self._expired(created_at):
+        self._entries[(model, query)] = (
+          np.frombuffer(blob, dtype=np.float32), created_at)
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, model: str, query: str) -> Optional[np.ndarray]:
+    key = (model, query)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      embedding, created_at = entry
+      if self._expired(created_at):
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return embedding
+
+  def get_many(self, model: str, queries: Iterable[str]) -> Dict[str, np.ndarray]:
+    found = {}
+    for query in queries:
+      embedding = self.get(model, query)
+      if embedding is not None:
+        found[query] = embedding
+    return found
+
+  def put(self, model: str, query: str, embedding):
+    self.put_many(model, [(query, embedding)])
+
+  def put_many(self, model: str, items: Iterable[Tuple[str, List[float]]]):
+    now = time.time()
+    with self._lock:
+      for query, embedding in items:
+        entry = (np.asarray(embedding, dtype=np.float32), now)
+        self._entries[(model, query)] = entry
+        self._entries.move_to_end((model, query))
+        self._pending[(model, query)] = entry
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+      due = not self._flush_scheduled and (
+        len(self._pending) >= self.flush_every
+        or time.monotonic() - self._last_flush >= self.flush_interval)
+      if due:
+        self._flush_scheduled = True
+    if due:
+      _schedule_flush(self)
+
+  def flush(self):
+    """Write pending entries and trim the file to max_entries"""
+    with self._flush_lock:
+      with self._lock:
+        pending, self._pending = self._pending, {}
+        self._last_flush = time.monotonic()
+        self._flush_scheduled = False
+      if pending:
+        self._write(pending)
+
+  def _write(self, pending: Dict[Tuple[str, str], Tuple[np.ndarray, float]]):
+    with self._connect() as conn:
+      conn.executemany(
+        "INSERT OR REPLACE INTO query_cache (model, query, embedding, created_at) "
+        "VALUES (?, ?, ?, ?)",
+        [
+          (model, query, embedding.tobytes(), created_at)
+          for (model, query), (embedding, created_at) in pending.items()
+        ]
+      )
+      conn.execute(
+        "DELETE FROM query_cache WHERE rowid NOT IN ("
+        "SELECT rowid FROM query_cache ORDER BY created_at DESC LIMIT ?)",
+        (self.max_entries,)
+      )
+      if self.ttl is not None:
+        conn.execute(
+          "DELETE FROM query_cache WHERE created_at < ?", (time.time() - self.ttl,))
+
+  def close(self):
+    self.flush()
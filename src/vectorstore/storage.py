@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import shutil
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+HEADER_FILE = "header.json"
+FORMAT_VERSION = 1
+
+
+def replace_atomically(path: str, write):
+  """Write to a temp file then rename, so readers mapping the old file are never torn"""
+  os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+  tmp_path = f"{path}.tmp-{os.getpid()}"
+  try:
+    write(tmp_path)
+    os.replace(tmp_path, path)
+  finally:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+
+
+def write_header(directory: str, header: Dict[str, Any]):
+  def write(tmp_path):
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+      json.dump({"format_version": FORMAT_VERSION, **header}, f, indent=2)
+
+  replace_atomically(os.path.join(directory, HEADER_FILE), write)
+
+
+def read_header(directory: str) -> Optional[Dict[str, Any]]:
+  path = os.path.join(directory, HEADER_FILE)
+  if not os.path.exists(path):
+    return None
+  with open(path, 'r', encoding='utf-8') as f:
+    return json.load(f)
+
+
+def new_version(directory: str) -> Tuple[str, str]:
+  """Create an empty version directory to save into, returning (version, path)"""
+  version = f"v-{time.time_ns()}"
+  version_path = os.path.join(directory, version)
+  os.makedirs(version_path)
+  return version, version_path
+
+
+def publish_version(directory: str, version: str, header: Dict[str, Any]):
+  """
+    Point the header at a fully written version. The header swap is atomic
+    and is the only pointer to the version, so a reader sees either the old
+    or the new files, never a mix of both.
+  """
+  previous = read_header(directory)
+  write_header(directory, {**header, "version": version})
+
+  # Keep the version just replaced for readers that are mid-load; drop older ones
+  keep = {version, (previous or {}).get("version")}
+  for entry in os.listdir(directory):
+    if entry.startswith("v-") and entry not in keep:
+      shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def version_path(directory: str, header: Dict[str, Any]) -> str:
+  # Saves from before versioning keep their files in the directory itself
+  return os.path.join(directory, header.get("version", ""))
+
+
+def load_version(directory: str, load: Callable[[Dict[str, Any]], None], attempts: int = 3) -> bool:
+  """
+    Call load(header) for the current version, retrying when a concurrent
+    save swapped the header (and pruned the version it pointed to) while it
+    was reading. load raises ValueError when the files don't match the
+    header. Returns False when nothing has been saved.
+  """
+  for attempt in range(attempts):
+    header = read_header(directory)
+    if header is None:
+      return False
+    try:
+      load(header)
+      return True
+    except (OSError, ValueError):
+      if attempt == attempts - 1 or read_header(directory) == header:
+        raise
+      time.sleep(0.05)
+  return False
+
+
+def save_matrix(path: str, matrix: np.ndarray):
+  """Save a float32 matrix as a raw .npy file"""
+  def write(tmp_path):
+    with open(tmp_path, 'wb') as f:
+      np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+
+  replace_atomically(path, write)
+
+
+def load_matrix(path: str, mmap_mode: Optional[str] = "r") -> np.ndarray:
+  """
+    Memory-map a saved matrix. Opening is O(1) and the OS page cache is
+    shared between processes; use mmap_mode="c" for a private writable copy
+    or None to read it fully into memory.
+  """
+  return np.load(path, mmap_mode=mmap_mode)
+
+
+def write_jsonl(path: str, records: Iterable[Dict[str, Any]]):
+  def write(tmp_path):
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+      for record in records:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+  replace_atomically(path, write)
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+  with open(path, 'r', encoding='utf-8') as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+  return list(iter_jsonl(path))
@@ -0,0 +1,138 @@
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, AsyncIterable, Optional
+from dataclasses import dataclass, field
+
+
+@dataclass
+class UpsertResult:
+  upserted_count: int = 0
+  segments: int = 0
+  retries: int = 0
+  failed_ids: List[str] = field(default_factory=list)
+  responses: List[Any] = field(default_factory=list)
+
+  def summary(self) -> str:
+    return (f"{self.upserted_count} vectors upserted in {self.segments} segments, "
+            f"{self.retries} retries, {len(self.failed_ids)} failed")
+
+
+class AdaptivePacer:
+  """
+    Shared delay between upserts, adjusted AIMD-style: errors and slow
+    responses back off multiplicatively, fast successes shrink the delay
+    back towards min_delay.
+  """
+
+  def __init__(
+    self,
+    min_delay: float = 0.0,
+    max_delay: float = 10.0,
+    target_latency: float = 1.0,
+  ):
+    self.min_delay = min_delay
+    self.max_delay = max_delay
+    self.target_latency = target_latency
+    self.delay = min_delay
+
+  async def wait(self):
+    if self.delay > 0:
+      await asyncio.sleep(self.delay)
+
+  def success(self, latency: float):
+    if latency > self.target_latency:
+      self.delay = min(self.max_delay, max(self.delay * 1.5, 0.1))
+    else:
+      self.delay = max(self.min_delay, self.delay * 0.8)
+
+  def failure(self):
+    self.delay = min(self.max_delay, max(self.delay * 2, 0.5))
+
+
+class UpsertPipeline:
+  """
+    Bounded producer / consumer upsert.
+
+    Vector segments arrive from an async iterator (typically one that is
+    still embedding later batches) and wait in a queue of at most
+    queue_size segments, so the producer is throttled to what the index
+    can absorb. Up to concurrency workers upsert in parallel, each segment
+    is retried on its own, and the ids of segments that still fail are
+    reported instead of being dropped.
+  """
+
+  def __init__(
+    self,
+    index,
+    concurrency: int = 4,
+    queue_size: int = 8,
+    max_retries: int = 3,
+    pacer: Optional[AdaptivePacer] = None,
+    threaded: bool = True,
+  ):
+    self.index = index
+    self.concurrency = concurrency
+    self.queue_size = queue_size
+    self.max_retries = max_retries
+    self.pacer = pacer or AdaptivePacer()
+    # Blocking clients (Pinecone) run in worker threads; in-process indexes don't
+    self.threaded = threaded
+
+  async def _upsert(self, segment: List[Dict[str, Any]]):
+    if self.threaded:
+      return await asyncio.to_thread(self.index.upsert, segment)
+    return self.index.upsert(segment)
+
+  async def _upsert_segment(self, segment: List[Dict[str, Any]], result: UpsertResult):
+    for attempt in range(self.max_retries + 1):
+      await self.pacer.wait()
+      started = time.monotonic()
+      try:
+        response = await self._upsert(segment)
+      except Exception as e:
+        self.pacer.failure()
+        if attempt == self.max_retries:
+          print(f"Error upserting segment of {len(segment)}: {str(e)}")
+          result.failed_ids.extend(vector['id'] for vector in segment)
+          return
+        result.retries += 1
+        logging.warning(
+          f"Upsert failed ({str(e)}), retry {attempt + 1}/{self.max_retries} "
+          f"with {self.pacer.delay:.2f}s pacing")
+        continue
+
+      self.pacer.success(time.monotonic() - started)
+      result.responses.append(response)
+      result.upserted_count += len(segment)
+      return
+
+  async def _worker(self, queue: asyncio.Queue, result: UpsertResult):
+    while True:
+      segment = await queue.get()
+      try:
+        if segment is None:
+          return
+        await self._upsert_segment(segment, result)
+      finally:
+        queue.task_done()
+
+  async def run(self, segments: AsyncIterable[List[Dict[str, Any]]]) -> UpsertResult:
+    result = UpsertResult()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+    workers = [
+      asyncio.create_task(self._worker(queue, result))
+      for _ in range(self.concurrency)
+    ]
+
+    try:
+      async for segment in segments:
+        if segment:
+          result.segments += 1
+          await queue.put(segment)
+    finally:
+      for _ in workers:
+        await queue.put(None)
+      await asyncio.gather(*workers)
+
+    return result
@@ -3,12 +3,25 @@ import logging
 import numpy as np
 
 from dotenv import load_dotenv
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Iterable, Iterator, AsyncIterator
+from itertools import islice
 import asyncio
 import json
+import hashlib
 from dataclasses import dataclass, asdict
 
 from documents.document_utils import DocumentUtils
+from vectorstore.local_index import LocalIndex
+from vectorstore.embedding_cache import EmbeddingCache
+from vectorstore.chunk_store import ChunkStore, split_metadata
+from vectorstore.prerank import PreRanker
+from vectorstore.embedder import AsyncEmbedder
+from vectorstore.upsert_pipeline import UpsertPipeline, AdaptivePacer
+from vectorstore.index_manifest import IndexManifest, ManifestDiff
+
+from config import (
+  VECTOR_BACKEND, LOCAL_INDEX_DIR, EMBEDDING_CACHE_PATH, UPSERT_CONCURRENCY, CHUNK_STORE_PATH
+)
 
 # from langchain_community.vectorstores import Pinecone as LangchainPinecone
 # from langchain.embeddings.base import Embeddings
@@ -34,6 +47,17 @@ class ChunkRelation:
   relation_type: str  # e.g., "next", "previous", "parent", "child", "reference"
 
 
+@dataclass
+class VectorRecord:
+  id: str
+  text: str
+  metadata: Dict[str, Any]
+  relationship: Optional[ChunkRelation]
+  index_metadata: Dict[str, Any]
+  # Media / reference fields moved to the chunk store, None when it is off
+  media: Optional[Dict[str, Any]] = None
+
+
 @dataclass
 class ChunkMetadata:
   chunk_id: str
@@ -56,62 +80,109 @@ class VectorStore:
     dimension: int = 1024,  # Voyage AI's default dimension
     weight_factor: float = 2.0,
     relationship_boost=1.5,
+    backend: str = VECTOR_BACKEND,
+    local_index_path: str = None,
+    create_index: bool = True,  # False for readers: a missing index raises instead of being created
+    embedding_cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+    chunk_store_path: Optional[str] = CHUNK_STORE_PATH,
   ):
 
-    pc = Pinecone(api_key=pinecone_api_key)
+    self.backend = backend
+    self.index_name = index_name
 
-    # Create new index if it doesn't exist
-    if index_name not in pc.list_indexes().names():
-      pc.create_index(
-        name=index_name,
+    if backend == "local":
+      self.index = LocalIndex(
         dimension=dimension,
-        metric='cosine',
-        spec=ServerlessSpec(
-          cloud='aws',
-          region='us-east-1'
-        )
+        path=local_index_path or os.path.join(LOCAL_INDEX_DIR, index_name),
+        create=create_index
       )
+    elif backend == "pinecone":
+      self.index = self.connect_pinecone(
+        index_name, pinecone_api_key, dimension, create_index)
+    else:
+      raise ValueError(f"Unknown vector store backend: {backend}")
 
-    self.index = pc.Index(index_name)
     self.weight_factor = weight_factor
     self.debug_output_file = debug_output_file
+    self.pre_ranker = PreRanker(relationship_boost=relationship_boost)
 
+    self.embedding_model = "voyage-2"
     self.embeddings = LangchainVoyageEmbeddings(
       voyage_api_key=voyage_api_key,
-      model="voyage-2"
+      model=self.embedding_model
     )
+    # Bulk document embedding for ingestion; queries still go through LangChain
+    self.embedder = AsyncEmbedder(
+      api_key=voyage_api_key,
+      model=self.embedding_model,
+      input_type="document"
+    )
+    self.embedding_cache_path = embedding_cache_path
+    self._embedding_cache = None
+    self.chunk_store_path = chunk_store_path
+    self._chunk_store = None
+    self.create_index = create_index
 
     self.voyage_client = voyageai.Client(api_key=voyage_api_key)
 
-  def calculate_relationships(
-    self,
-    metadata,
-    chunks: List[Dict]
-  ):
-    """Calculate relationship strength between a chunk and related chunks"""
-    chunk_id = metadata['id']
-    related_chunks = metadata.get('related_chunks', [])
-    relationship_strength = 1.0  # Base strength
+  def connect_pinecone(self, index_name: str, api_key: str, dimension: int, create: bool = True):
+    pc = Pinecone(api_key=api_key)
 
-    if related_chunks:
-      relationship_strength = 0.2 * len(related_chunks)
-    else:
-      for chunk in chunks:
-        if chunk_id in chunk.get('related_chunks', []):
-
-          related_chunks.append(chunk['id'])
-          # Boost strength based on number of related questions
-          relationship_strength += 0.2
-        # if client or service, then boost strength
-
-    if related_chunks:
-      return ChunkRelation(
-        chunk_id=chunk_id,
-        relationship_ids=related_chunks,
-        relationship_strength=relationship_strength,
-        relation_type="reference"
+    # Create new index if it doesn't exist
+    if index_name not in pc.list_indexes().names():
+      if not create:
+        raise ValueError(f"Pinecone index {index_name} does not exist. Run the embed step first.")
+      pc.create_index(
+        name=index_name,
+        dimension=dimension,
+        metric='cosine',
+        spec=ServerlessSpec(
+          cloud='aws',
+          region='us-east-1'
+        )
       )
 
+    return pc.Index(index_name)
+
+  def manifest_key(self) -> str:
+    """
+      Identity of the index the manifest describes: backend plus index name,
+      and for the local backend its directory, so switching backends or
+      index paths never reuses another index's manifest.
+    """
+    if self.backend == "local":
+      path_hash = hashlib.md5(os.path.abspath(self.index.path or "").encode()).hexdigest()[:8]
+      return f"local-{self.index_name}-{path_hash}"
+    return f"{self.backend}-{self.index_name}"
+
+  def vector_count(self) -> int:
+    if self.backend == "local":
+      return len(self.index)
+    return self.index.describe_index_stats().total_vector_count
+
+  @property
+  def embedding_cache(self) -> Optional[EmbeddingCache]:
+    # Opened lazily: only ingestion needs it, not the chat app
+    if self._embedding_cache is None and self.embedding_cache_path:
+      self._embedding_cache = EmbeddingCache(self.embedding_cache_path)
+    return self._embedding_cache
+
+  @property
+  def chunk_store(self) -> Optional[ChunkStore]:
+    if self._chunk_store is None and self.chunk_store_path:
+      self._chunk_store = ChunkStore(self.chunk_store_path, create=self.create_index)
+    return self._chunk_store
+
+  async def embed_texts(self, texts: List[str]):
+    """Embed document texts, only sending cache misses to Voyage"""
+    if self.embedding_cache is None:
+      return await self.embedder.embed(texts)
+    return await self.embedding_cache.aembed(
+      f"{self.embedding_model}:document",
+      texts,
+      self.embedder.embed
+    )
+
   def prepare_text(self, chunk):
     subjects = ", ".join(chunk.get('subjects', []))
     headings = ", ".join(chunk.get('headings', []))
@@ -184,6 +255,10 @@ class VectorStore:
       flattened["media_texts"] = [
           media["text"] for media in media_elements if "text" in media
       ]
+      # Stable per element, so hits sharing media can be deduped
+      flattened["media_ids"] = [
+          media["id"] for media in media_elements if media.get("id")
+      ]
     # Handle chunk metadata - these are already simple types
     if "chunk_metadata" in metadata:
       chunk_meta = metadata["chunk_metadata"]
@@ -193,32 +268,37 @@ class VectorStore:
 
     return flattened
 
+  def load_document(self, chunk) -> Tuple[str, Dict]:
+    """Build the embedding text and flat index metadata for one chunk"""
+    metadata = self.flatten_metadata(chunk['metadata'])
+    text = self.prepare_text(chunk)
+    metadata['text'] = text
+    metadata['id'] = chunk['chunk_id']
+
+    # Add other metadata fields conditionally
+    question = chunk.get('question')
+    if question is not None:
+      metadata['question'] = question
+    services = chunk.get('services')
+    if services is not None:
+      metadata['services'] = services
+    subjects = chunk.get('subjects')
+    if subjects is not None:
+      metadata['subjects'] = subjects
+
+    categories = chunk.get('categories')
+    if categories is not None:
+      metadata['categories'] = categories
+
+    return text, metadata
+
   def load_documents(self, data) -> Tuple[List[str], List[Dict]]:
 
     # TODO Improve documents chunking, formatting etc.
     texts = []
     metadatas = []
     for chunk in data:
-      metadata = self.flatten_metadata(chunk['metadata'])
-      text = self.prepare_text(chunk)
-      metadata['text'] = text
-      metadata['id'] = chunk['chunk_id']
-
-      # Add other metadata fields conditionally
-      question = chunk.get('question')
-      if question is not None:
-        metadata['question'] = question
-      services = chunk.get('services')
-      if services is not None:
-        metadata['services'] = services
-      subjects = chunk.get('subjects')
-      if subjects is not None:
-        metadata['subjects'] = subjects
-
-      categories = chunk.get('categories')
-      if categories is not None:
-        metadata['categories'] = categories
-
+      text, metadata = self.load_document(chunk)
       texts.append(text)
       metadatas.append(metadata)
 
@@ -251,125 +331,307 @@ class VectorStore:
 
     return enhanced
 
-  def embed_documents(
+  async def embed_documents(
     self,
     texts,
     metadatas=None,
     chunk_relationships: Optional[List[ChunkRelation]] = None
-  ):
+  ) -> np.ndarray:
+    """Embed texts and scale each vector by exp(priority / weight_factor)"""
     # Calculate base priorities
-    priorities = [
+    priorities = np.array([
       metadata.get('priority', 0.5)
       for metadata in metadatas
-    ]
+    ], dtype=np.float32)
 
     # Adjust priorities based on relationships
     if chunk_relationships:
-      for i, relationship in enumerate(chunk_relationships):
-        if relationship:
-          priorities[i] *= relationship.relationship_strength
-
-    base_embeddings = self.embeddings.embed_documents(texts)
+      priorities *= np.array([
+        relationship.relationship_strength if relationship else 1.0
+        for relationship in chunk_relationships
+      ], dtype=np.float32)
 
-    weighted_embeddings = []
-    for embedding, priority in zip(base_embeddings, priorities):
-      weight = np.exp(priority / self.weight_factor)
-      weighted_embedding = np.array(embedding) * weight  # Scale vector
-      weighted_embeddings.append(weighted_embedding.tolist())
+    base_embeddings = np.asarray(await self.embed_texts(texts), dtype=np.float32)
+    weights = np.exp(priorities / self.weight_factor)
 
-    return weighted_embeddings
+    return base_embeddings * weights[:, None]  # Scale vectors
 
-  async def upsert_documents(self, data, segment_size: int = 100, delay: float = 0.1, debug=False) -> List[str]:
+  def build_relationships(self, data) -> Tuple[Dict[str, ChunkRelation], float]:
     """
-      Add documents to Pinecone index
-      documents: List of dicts with 'text' and optional metadata
+      Relationships for every chunk id, plus the strongest one for normalisation.
+
+      A chunk with its own related_chunks gets 0.2 per link. Chunks that are
+      only referenced by others get no relationship: the original per-chunk
+      scan looked for references under a key chunks don't carry, so it never
+      found any, and priorities (and PRIORITY_THRESHOLD) are tuned to that.
     """
-    print(f"upsert_documents debug: {debug}")
-    texts, metadatas = self.load_documents(data)
+    ids = []
+    related_chunks = []
+    for chunk in data:
+      ids.append(chunk['chunk_id'])
+      related_chunks.append(
+        self.flatten_metadata(chunk['metadata']).get('related_chunks') or [])
+
+    link_counts = np.array([len(related) for related in related_chunks], dtype=np.float64)
+    strengths = 0.2 * link_counts
+
+    has_links = link_counts > 0
+    relationships = {
+      ids[i]: ChunkRelation(
+        chunk_id=ids[i],
+        relationship_ids=list(related_chunks[i]),
+        relationship_strength=float(strengths[i]),
+        relation_type="reference"
+      )
+      for i in np.flatnonzero(has_links)
+    }
 
-    chunk_relationships = None
+    max_relationship_strength = (
+      float(strengths[has_links].max()) if has_links.any() else 1.0)
+    return relationships, max_relationship_strength
 
-    if metadatas:
-      chunk_relationships = [
-        self.calculate_relationships(
-          metadata,
-          data
-        )
-        for metadata in metadatas
-      ]
-
-    max_relationship_strength = max(
-      relationship.relationship_strength
-      for relationship in chunk_relationships
-      if relationship is not None
-    )
+  def iter_records(self, data, relationships=None) -> Iterator[VectorRecord]:
+    """
+      Lazily turn chunks into VectorRecords. Only one chunk's prepared text
+      and metadata exist at a time; relationships come from one prior pass.
+    """
+    if relationships is None:
+      relationships = self.build_relationships(data)
+    chunk_relationships, max_relationship_strength = relationships
 
-    ids = [
+    for i, chunk in enumerate(data):
+      text, metadata = self.load_document(chunk)
+      id = (
         metadata.get('id') or  # Use existing ID if provided
         metadata.get('chunk_id') or  # Fallback to document_id
         f"chunk_{i}"  # Default to incremental ID
-        for i, metadata in enumerate(metadatas)
-    ]
+      )
+      relationship = chunk_relationships.get(id)
+      index_metadata = self.enhance_metadata(
+        metadata,
+        relationship,
+        max_relationship_strength
+      )
+      media = None
+      if self.chunk_store is not None:
+        # Text and media go to the chunk store; the index keeps filter fields
+        index_metadata, _, media = split_metadata(index_metadata)
+      yield VectorRecord(
+        id=id,
+        text=text,
+        metadata=metadata,
+        relationship=relationship,
+        index_metadata=index_metadata,
+        media=media
+      )
 
-    weighted_embeddings = self.embed_documents(
-      texts, metadatas, chunk_relationships)
+  def store_chunks(self, records: Iterable[VectorRecord]):
+    """Write each record's text and media to the chunk store, if there is one"""
+    if self.chunk_store is None:
+      return
+    self.chunk_store.put_many(
+      (record.id, record.text, record.media or {}) for record in records)
 
-    # Prepare vectors for upsert
-    vectors = [
-        {
-            "id": id,
-            "values": embedding,
-            "metadata": self.enhance_metadata(
-                metadata,
-                relationship if chunk_relationships else None,
-                max_relationship_strength
-            )
-        }
-        for i, (embedding, metadata, id, relationship) in enumerate(
-            zip(
-              weighted_embeddings,
-              metadatas,
-              ids,
-              (chunk_relationships if chunk_relationships else [
-               None] * len(ids))
-            )
-        )
-    ]
+  async def stream_vector_segments(
+    self,
+    records: Iterable[VectorRecord],
+    segment_size: int = 100,
+    embed_batch_size: int = 512
+  ) -> AsyncIterator[List[Dict]]:
+    """
+      chunk -> prepare_text -> embed batch -> weight -> upsert segment.
+      Records are pulled embed_batch_size at a time and segments are handed
+      to the upsert pipeline's bounded queue, so memory stays O(batch).
+    """
+    records = iter(records)
+    while True:
+      batch = list(islice(records, embed_batch_size))
+      if not batch:
+        return
+
+      weighted_embeddings = await self.embed_documents(
+        [record.text for record in batch],
+        [record.metadata for record in batch],
+        [record.relationship for record in batch]
+      )
+      for start in range(0, len(batch), segment_size):
+        yield [
+          {
+            "id": record.id,
+            "values": embedding.tolist(),
+            "metadata": record.index_metadata
+          }
+          for record, embedding in zip(
+            batch[start:start + segment_size],
+            weighted_embeddings[start:start + segment_size]
+          )
+        ]
+
+  def upsert_pipeline(self, delay: float = 0.0) -> UpsertPipeline:
+    return UpsertPipeline(
+      self.index,
+      concurrency=UPSERT_CONCURRENCY,
+      pacer=AdaptivePacer(min_delay=delay),
+      threaded=self.backend != "local"
+    )
+
+  async def upsert_documents(self, data, segment_size: int = 100, delay: float = 0.0, debug=False):
+    """
+      Add documents to the index
+      documents: List of dicts with 'text' and optional metadata
+    """
+    print(f"upsert_documents debug: {debug}")
+    relationships = self.build_relationships(data)
+    records = self.iter_records(data, relationships)
 
     if (debug):
+      # save vectors sans values, no need to embed
       debug = [
         {
-          "id": vector['id'],
-          "metadata": vector['metadata']
+          "id": record.id,
+          "metadata": record.index_metadata
         }
-        for vector in vectors
+        for record in records
       ]
-      # save vectors sans values
       if self.debug_output_file:
         DocumentUtils.save_to_json(debug, self.debug_output_file)
       else:
         print("Warn: No debug output file")
       return debug
-    else:
-      def segment_list(lst: List[Any], segment_size: int):
-        for i in range(0, len(lst), segment_size):
-          yield lst[i:i + segment_size]
 
-      # Upsert vectors in smaller segments
-      upsert_responses = []
-      for vector_segment in segment_list(vectors, segment_size):
-        try:
-          print("Inserting vector segement...")
-          response = self.index.upsert(vector_segment)
-          upsert_responses.append(response)
-          await asyncio.sleep(delay)  # Add delay to avoid rate limiting
+    # Stored first, so every vector that lands in the index can be resolved
+    self.store_chunks(self.iter_records(data, relationships))
+
+    result = await self.upsert_pipeline(delay).run(
+      self.stream_vector_segments(records, segment_size))
+    print(f"Upsert: {result.summary()}")
+
+    if self.backend == "local":
+      self.index.save()
 
+    return result
+
+  async def sync_documents(
+    self,
+    data,
+    manifest: IndexManifest,
+    segment_size: int = 100,
+    delay: float = 0.0,
+    delete_batch_size: int = 1000
+  ) -> ManifestDiff:
+    """
+      Incrementally bring the index in line with data using the manifest:
+      embed and upsert only new or re-worded chunks, patch metadata in place
+      when only metadata changed, and delete ids that no longer exist.
+    """
+    relationships = self.build_relationships(data)
+
+    # A recreated or emptied index no longer holds what the manifest lists;
+    # rebuild it fully rather than skipping every "unchanged" chunk
+    vector_count = self.vector_count()
+    if manifest.entries and vector_count != len(manifest.entries):
+      print(f"Warn: index holds {vector_count} vectors but the manifest lists "
+            f"{len(manifest.entries)}, rebuilding the index")
+      manifest.clear()
+
+    # First pass keeps only hashes; records are rebuilt lazily below. Media
+    # are hashed with the index metadata so a media-only edit reaches the store
+    current = {
+      record.id: (
+        IndexManifest.hash_text(record.text),
+        IndexManifest.hash_metadata({**record.index_metadata, **(record.media or {})})
+      )
+      for record in self.iter_records(data, relationships)
+    }
+
+    diff = manifest.diff(current)
+    print(f"Index sync: {diff.summary()}")
+
+    if self.chunk_store is not None:
+      # Only new or edited chunks, plus any the store lacks (e.g. it was just
+      # enabled); unchanged chunks are already stored as they are
+      to_store = set(diff.added) | set(diff.changed) | set(diff.metadata_only)
+      to_store |= set(current) - self.chunk_store.existing(list(current))
+      self.store_chunks(
+        record for record in self.iter_records(data, relationships)
+        if record.id in to_store
+      )
+
+    failed_ids = set()
+
+    to_embed = set(diff.added) | set(diff.changed)
+    metadata_only = set(diff.metadata_only)
+    if self.chunk_store is not None:
+      # update() merges metadata, so it can't drop fields that moved to the
+      # chunk store; re-upsert instead (vectors come from the embedding cache)
+      to_embed |= metadata_only
+      metadata_only = set()
+    if to_embed:
+      result = await self.upsert_pipeline(delay).run(
+        self.stream_vector_segments(
+          (
+            record for record in self.iter_records(data, relationships)
+            if record.id in to_embed
+          ),
+          segment_size
+        )
+      )
+      print(f"Upsert: {result.summary()}")
+      failed_ids.update(result.failed_ids)
+
+    # The index metric is cosine, so the priority weight applied to the
+    # vector has no effect on ranking and metadata can be patched in place
+    if metadata_only:
+      for record in self.iter_records(data, relationships):
+        if record.id not in metadata_only:
+          continue
+        try:
+          self.index.update(id=record.id, set_metadata=record.index_metadata)
         except Exception as e:
-          print(f"Error upserting segment: {str(e)}")
+          print(f"Error updating metadata for {record.id}: {str(e)}")
+          failed_ids.add(record.id)
+
+    deleted_ids = []
+    for i in range(0, len(diff.removed), delete_batch_size):
+      batch = diff.removed[i:i + delete_batch_size]
+      try:
+        self.index.delete(ids=batch)
+        deleted_ids.extend(batch)
+      except Exception as e:
+        print(f"Error deleting {len(batch)} vectors: {str(e)}")
+        failed_ids.update(batch)
+
+    if self.chunk_store is not None and deleted_ids:
+      self.chunk_store.delete_many(deleted_ids)
+
+    # Failed ids keep their previous manifest entry so the next run retries them
+    manifest.update(
+      {
+        chunk_id: hashes
+        for chunk_id, hashes in current.items()
+        if chunk_id not in failed_ids
+      },
+      removed=deleted_ids
+    )
+    manifest.save()
+
+    if self.backend == "local":
+      self.index.save()
+
+    diff.failed = sorted(failed_ids)
+    return diff
 
-      return upsert_responses
-      # upsert_response = self.index.upsert(vectors)
-      # return upsert_response
+  def candidate_texts(self, ids: List[str], metadatas: List[Dict]) -> List[str]:
+    """
+      Text for each query match from the index metadata, with one batched
+      chunk store lookup for any match that has none.
+    """
+    missing = [id for id, metadata in zip(ids, metadatas) if not metadata.get('text')]
+    stored = self.chunk_store.get_texts(missing) if missing and self.chunk_store is not None else {}
+    return [
+      metadata.get('text') or stored.get(id, 'Text not found')
+      for id, metadata in zip(ids, metadatas)
+    ]
 
   async def search_similar(
     self,
@@ -377,8 +639,14 @@ class VectorStore:
     k: int = 5,
     filter=None,
     rerank=True,
-    rerank_k=None
+    rerank_k: Optional[int] = None
   ) -> List[Dict]:
+    """
+      Vector query for k candidates, then (with rerank) the Voyage rerank.
+      With rerank_k, a local pre-rank first keeps the best rerank_k
+      candidates, and at most that many results are returned instead of k.
+      None sends every candidate to Voyage.
+    """
     query_embedding = self.embeddings.embed_documents([query])[0]
 
     # Query Pinecone
@@ -389,45 +657,47 @@ class VectorStore:
       filter=filter
     )
     # Process and return results
-    results = []
-    candidates = []
-    texts = []
+    ids = []
     metadatas = []
     scores = []
 
     for match in query_response.matches:
-      text = match.metadata.get('text', 'Text not found')
-      texts.append(text)
+      ids.append(match.id)
       metadatas.append(match.metadata)
       scores.append(match.score)
-      candidates.append((text, match.score, match.metadata))
+
+    texts = self.candidate_texts(ids, metadatas)
 
     # Apply reranking if requested
     if rerank and texts:
+      # Cheap local pass first: rerank latency grows with documents sent
+      selected = self.pre_ranker.select(query, ids, texts, scores, metadatas, rerank_k)
+
       # Get reranking scores
       rerank_reresponse = self.voyage_client.rerank(
         query=query,
-        documents=texts,
+        documents=[texts[idx] for idx in selected],
         model="rerank-2",
-        top_k=k
+        top_k=min(k, len(selected))
       )
 
-      # Create reranked results
-      reranked_results = []
-
       # Access the results through the results attribute
-      for item in rerank_reresponse.results:
-        idx = item.index
-        reranked_results.append((
-            texts[idx],
-            item.relevance_score,  # Use reranking score
-            metadatas[idx]
-        ))
-
-      return reranked_results
-
-    # Return original results if no reranking
-    return candidates[:k]
+      ranked = [
+        (selected[item.index], item.relevance_score)  # Use reranking score
+        for item in rerank_reresponse.results
+      ]
+    else:
+      # Original order if no reranking
+      ranked = list(enumerate(scores))[:k]
+
+    # Media are only fetched for the results actually returned
+    media = self.chunk_store.get_media(
+      [ids[idx] for idx, _ in ranked]) if self.chunk_store is not None else {}
+
+    return [
+      (texts[idx], score, {**metadatas[idx], **media.get(ids[idx], {})})
+      for idx, score in ranked
+    ]
 
     # results = self.vector_store.similarity_search_with_score(
     #   query=query,
@@ -3,12 +3,20 @@ import pickle
 import json
 import numpy as np
 import voyageai
-import time
+import asyncio
 import logging
 import streamlit as st
 
 from dotenv import load_dotenv
 
+from vectorstore.metadata_filter import ColumnarMetadata
+from vectorstore import storage
+from vectorstore.query_cache import QueryCache
+from vectorstore.embedding_cache import EmbeddingCache
+from vectorstore.embedder import AsyncEmbedder
+
+from config import LOCAL_INDEX_DIR, EMBEDDING_CACHE_PATH
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -18,22 +26,31 @@ load_dotenv()
 
 class VectorDB:
 
-  def __init__(self, name, api_key=None):
+  EMBEDDINGS_FILE = "embeddings.npy"
+  METADATA_FILE = "metadata.jsonl"
+  QUERY_CACHE_FILE = "query_cache.sqlite"
+  LEGACY_DB_FILE = "vector_db.pkl"
+
+  def __init__(self, name, api_key=None, model="voyage-2"):
     if api_key is None:
       api_key = os.getenv("VOYAGE_API_KEY")
 
     self.client = voyageai.Client(api_key=api_key)
+    self.embedder = AsyncEmbedder(api_key=api_key, model=model)
     self.name = name
-    self.embeddings = []
+    self.model = model
+    self.embeddings = np.zeros((0, 0), dtype=np.float32)
     self.metadata = []
-    self.query_cache = {}
-    self.db_path = f"./data/db/{name}/vector_db.pkl"
+    self.columns = None
+    self.db_dir = os.path.join(LOCAL_INDEX_DIR, name)
+    self.query_cache = QueryCache(self._path(self.QUERY_CACHE_FILE))
+    self.embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
 
   def load_data(self, data):
-    if self.embeddings and self.metadata:
+    if len(self.embeddings) and self.metadata:
       print("Vector database is already loaded. Skipping data loading.")
       return
-    if os.path.exists(self.db_path):
+    if self.db_exists():
       print("Loading vector database from disk")
       self.load_db()
 
@@ -59,76 +76,151 @@ class VectorDB:
     print("Vector database loaded and saved.")
 
   def _embed_and_store(self, texts, metadatas):
-    batch_size = 128
-    result = []
-    for i in range(0, len(texts), batch_size):
-      result.append(
-        self.client.embed(
-          texts[i: i + batch_size],
-          model="voyage-2"
-        ).embeddings
-      )
-      # Add a delay of 1 second between each call to avoid rate limits
-      time.sleep(1)
-    self.embeddings = [embedding for batch in result for embedding in batch]
+    embeddings = self.embedding_cache.embed(
+      self.model, texts, self._embed_batches)
+    self.set_embeddings(embeddings)
     self.metadata = metadatas
+    self.columns = None
 
-  def save_db(self):
-    data = {
-      "embeddings": self.embeddings,
-      "metadata": self.metadata,
-      "query_cache": json.dumps(self.query_cache),
-    }
+  def _embed_batches(self, texts):
+    # Token-packed, concurrent and rate-limited instead of fixed sleeps
+    return asyncio.run(self.embedder.embed(texts))
+
+  def set_embeddings(self, embeddings):
+    """Hold embeddings as one contiguous, L2-normalised float32 matrix"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2:
+      matrix = matrix.reshape(len(matrix), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    self.embeddings = np.ascontiguousarray(matrix / norms)
 
-    os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-    with open(self.db_path, "wb") as file:
-      pickle.dump(data, file)
+  def _path(self, file_name):
+    return os.path.join(self.db_dir, file_name)
+
+  def db_exists(self):
+    return (storage.read_header(self.db_dir) is not None
+            or os.path.exists(self._path(self.LEGACY_DB_FILE)))
+
+  def save_db(self):
+    """
+      Write embeddings as a raw .npy matrix and metadata as JSONL into a new
+      version directory, then swap in the header (model name, dimension,
+      count) pointing at it, like LocalIndex.save.
+    """
+    version, version_path = storage.new_version(self.db_dir)
+    storage.save_matrix(os.path.join(version_path, self.EMBEDDINGS_FILE), self.embeddings)
+    storage.write_jsonl(os.path.join(version_path, self.METADATA_FILE), self.metadata)
+    self.query_cache.flush()
+    storage.publish_version(self.db_dir, version, {
+      "model": self.model,
+      "dimension": int(self.embeddings.shape[1]) if self.embeddings.ndim == 2 else 0,
+      "count": len(self.embeddings),
+      "normalized": True,
+    })
 
   def load_db(self):
-    if not os.path.exists(self.db_path):
+    header = storage.read_header(self.db_dir)
+    if header is None:
+      if os.path.exists(self._path(self.LEGACY_DB_FILE)):
+        self._migrate_legacy_db()
+        return
       raise ValueError(
         "Vector database file not found. use load_data to create a new database.")
-    with open(self.db_path, "rb") as file:
-      data = pickle.load(file)
 
-    self.embeddings = data["embeddings"]
-    # logging.debug(self.embeddings)
+    if not storage.load_version(self.db_dir, self._load_version):
+      raise ValueError(
+        "Vector database file not found. use load_data to create a new database.")
 
+  def _load_version(self, header):
+    if header.get("model") != self.model:
+      raise ValueError(
+        f"Vector database {self.name} was built with {header.get('model')}, not {self.model}")
+
+    version_path = storage.version_path(self.db_dir, header)
+    # Memory-mapped, read-only: near-instant to open and shared across workers
+    embeddings = storage.load_matrix(os.path.join(version_path, self.EMBEDDINGS_FILE))
+    metadata = storage.read_jsonl(os.path.join(version_path, self.METADATA_FILE))
+    count = header["count"]
+    if embeddings.shape[0] != count or len(metadata) != count:
+      raise ValueError(
+        f"Vector database {self.name} is inconsistent: header has {count} rows, "
+        f"embeddings {embeddings.shape[0]}, metadata {len(metadata)}")
+
+    self.embeddings = embeddings
+    self.metadata = metadata
+    self.columns = None
+
+  def _migrate_legacy_db(self):
+    """Load a pickled vector_db.pkl once and rewrite it in the mmap format"""
+    print("Migrating pickled vector database to the memory-mapped format")
+    with open(self._path(self.LEGACY_DB_FILE), "rb") as file:
+      data = pickle.load(file)
+
+    self.set_embeddings(data["embeddings"])
     self.metadata = data["metadata"]
-    self.query_cache = json.loads(data["query_cache"])
+    self.columns = None
+    self.query_cache.put_many(
+      self.model, json.loads(data["query_cache"]).items())
+    self.save_db()
 
-  def search(self, query, k=5, similarity_threshold=0.75):
-    if query in self.query_cache:
-      query_embedding = self.query_cache[query]
-    else:
-      query_embedding = self.client.embed(
-        [query], model="voyage-2").embeddings[0]
-      self.query_cache[query] = query_embedding
+  def get_columns(self) -> ColumnarMetadata:
+    if self.columns is None:
+      self.columns = ColumnarMetadata.from_rows(self.metadata)
+    return self.columns
 
-    if not self.embeddings:
+  def embed_queries(self, queries):
+    """Embed queries not already in the query cache, in as few calls as possible"""
+    cached = self.query_cache.get_many(self.model, queries)
+    missing = list(dict.fromkeys(
+      query for query in queries if query not in cached))
+    batch_size = 128
+    for i in range(0, len(missing), batch_size):
+      batch = missing[i: i + batch_size]
+      embeddings = self.client.embed(batch, model=self.model).embeddings
+      self.query_cache.put_many(self.model, zip(batch, embeddings))
+      cached.update(zip(batch, embeddings))
+
+    matrix = np.asarray(
+      [cached[query] for query in queries], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+  def _select(self, similarities, k, similarity_threshold):
+    """Indices of the k best scores above the threshold, best first"""
+    candidates = np.flatnonzero(similarities >= similarity_threshold)
+    if len(candidates) > k:
+      top = np.argpartition(-similarities[candidates], k - 1)[:k]
+      candidates = candidates[top]
+    return candidates[np.argsort(-similarities[candidates], kind="stable")]
+
+  def search_many(self, queries, k=5, similarity_threshold=0.75, filter=None):
+    """Score a batch of queries with a single matrix product"""
+    if not len(self.embeddings):
       raise ValueError("No data loaded in the vector database.")
 
-    simliarities = np.dot(self.embeddings, query_embedding)
-    top_indices = np.argsort(simliarities)[::-1]
-    top_examples = []
-
-    for idx in top_indices:
-      if simliarities[idx] >= similarity_threshold:
-        if idx >= len(self.metadata):
-          print(f"Index {idx} is out of bounds for metadata with length {
-                len(self.metadata)}")
-          continue
-        example = {
+    query_embeddings = self.embed_queries(queries)
+    similarities = query_embeddings @ self.embeddings.T
+
+    if filter:
+      # Pinecone-style metadata filter, applied before ranking
+      similarities[:, ~self.get_columns().mask(filter)] = -np.inf
+
+    results = []
+    for row in similarities:
+      results.append([
+        {
           "metadata": self.metadata[idx],
-          "similarity": simliarities[idx],
+          "similarity": row[idx],
         }
-        top_examples.append(example)
+        for idx in self._select(row, k, similarity_threshold)
+      ])
 
-        if len(top_examples) >= k:
-          break
+    return results
 
-    self.save_db()
-    return top_examples
+  def search(self, query, k=5, similarity_threshold=0.75, filter=None):
+    return self.search_many([query], k, similarity_threshold, filter)[0]
 
   def get_embedding_by_chunk_number(self, chunk_number):
     try: